@@ -0,0 +1,111 @@
+"""add lookup tables and consumer features view
+
+Revision ID: 3c9e4b7a1f20
+Revises: ef33917cb51f
+Create Date: 2026-10-18 17:05:12.418230
+
+"""
+import csv
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e4b7a1f20'
+down_revision: Union[str, None] = 'ef33917cb51f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+
+# One ready-to-score row per (consumer, month). Appliance lookups are averaged
+# per consumer; tariffs take the first row per location in CSV order, which is
+# the row the pandas merge + drop_duplicates used to keep.
+LIVE_VIEW_SQL = """
+CREATE VIEW consumer_features_live AS
+SELECT u.consumer_number,
+       b.month,
+       u.family_members,
+       u.working_members,
+       b.units_consumed,
+       b.cost_per_unit,
+       COALESCE(a.total_usage_hours, 0) AS total_usage_hours,
+       COALESCE(a.power_rating_w, 0) AS "Power_Rating_W",
+       COALESCE(a.units_per_hour_kwh, 0) AS "Units_Consumed_Per_Hour_kWh",
+       t.base_tariff AS "Base Tariff (cents/kWh)",
+       t.final_unit_cost AS "Final Per Unit Cost (cents/kWh)"
+FROM users u
+JOIN bills b ON b.consumer_number = u.consumer_number
+LEFT JOIN (
+    SELECT ap.consumer_number,
+           SUM(ap.usage_hours) AS total_usage_hours,
+           AVG(COALESCE(c.power_rating_w, 0)) AS power_rating_w,
+           AVG(COALESCE(c.units_per_hour_kwh, 0)) AS units_per_hour_kwh
+    FROM appliances ap
+    LEFT JOIN appliance_catalog c ON c.appliance_name = LOWER(TRIM(ap.appliance_name))
+    GROUP BY ap.consumer_number
+) a ON a.consumer_number = u.consumer_number
+LEFT JOIN (
+    SELECT DISTINCT ON (location) location, base_tariff, final_unit_cost
+    FROM tariffs
+    ORDER BY location, id
+) t ON t.location = LOWER(TRIM(u.location))
+"""
+
+
+def _read_csv(name):
+    with open(os.path.join(DATA_DIR, name), newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    appliance_catalog = op.create_table('appliance_catalog',
+    sa.Column('appliance_name', sa.String(), nullable=False),
+    sa.Column('power_rating_w', sa.Float(), nullable=False),
+    sa.Column('units_per_hour_kwh', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('appliance_name')
+    )
+    tariffs = op.create_table('tariffs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('location', sa.String(), nullable=False),
+    sa.Column('base_tariff', sa.Float(), nullable=False),
+    sa.Column('final_unit_cost', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tariffs_location'), 'tariffs', ['location'], unique=False)
+
+    op.bulk_insert(appliance_catalog, [
+        {
+            'appliance_name': row['appliance_name'].strip().lower(),
+            'power_rating_w': float(row['Power_Rating_W']),
+            'units_per_hour_kwh': float(row['Units_Consumed_Per_Hour_kWh']),
+        }
+        for row in _read_csv('household.csv')
+    ])
+    op.bulk_insert(tariffs, [
+        {
+            'id': i,
+            'location': row['location'].strip().lower(),
+            'base_tariff': float(row['Base Tariff (cents/kWh)']),
+            'final_unit_cost': float(row['Final Per Unit Cost (cents/kWh)']),
+        }
+        for i, row in enumerate(_read_csv('electricity1.csv'), start=1)
+    ])
+
+    op.execute(LIVE_VIEW_SQL)
+    op.execute("CREATE MATERIALIZED VIEW consumer_features AS SELECT * FROM consumer_features_live")
+    # Unique index lets the batch job use REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.execute("CREATE UNIQUE INDEX ix_consumer_features_consumer_month ON consumer_features (consumer_number, month)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS consumer_features")
+    op.execute("DROP VIEW IF EXISTS consumer_features_live")
+    op.drop_index(op.f('ix_tariffs_location'), table_name='tariffs')
+    op.drop_table('tariffs')
+    op.drop_table('appliance_catalog')
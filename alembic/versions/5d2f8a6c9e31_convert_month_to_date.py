@@ -0,0 +1,133 @@
+"""convert bills and predictions month to date
+
+Revision ID: 5d2f8a6c9e31
+Revises: 3c9e4b7a1f20
+Create Date: 2026-10-18 19:42:07.113504
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2f8a6c9e31'
+down_revision: Union[str, None] = '3c9e4b7a1f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTH_NAME = "(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*"
+
+# Month strings the app has stored so far, normalised to the first day of the
+# month: "2025-03" / "2025-03-17", "03/2025", "March 2025" / "Mar 2025", and a
+# bare month name ("March"), which old clients sent meaning the current year.
+# Anything else maps to NULL.
+MONTH_TO_DATE = f"""
+CASE
+    WHEN TRIM(month) ~ '^\\d{{4}}-\\d{{1,2}}(-\\d{{1,2}})?$'
+        THEN to_date(split_part(TRIM(month), '-', 1) || '-' || split_part(TRIM(month), '-', 2), 'YYYY-MM')
+    WHEN TRIM(month) ~ '^\\d{{1,2}}/\\d{{4}}$'
+        THEN to_date(TRIM(month), 'MM/YYYY')
+    WHEN TRIM(month) ~* '^{MONTH_NAME}\\s+\\d{{4}}$'
+        THEN to_date(initcap(substr(TRIM(month), 1, 3)) || ' ' || substring(TRIM(month) from '\\d{{4}}$'), 'Mon YYYY')
+    WHEN TRIM(month) ~* '^{MONTH_NAME}$'
+        THEN to_date(initcap(substr(TRIM(month), 1, 3)) || ' ' || EXTRACT(YEAR FROM CURRENT_DATE)::int, 'Mon YYYY')
+END
+"""
+
+# Unchanged from 3c9e4b7a1f20; the views select bills.month, so they are
+# dropped around the type change and recreated on top of the new column.
+LIVE_VIEW_SQL = """
+CREATE VIEW consumer_features_live AS
+SELECT u.consumer_number,
+       b.month,
+       u.family_members,
+       u.working_members,
+       b.units_consumed,
+       b.cost_per_unit,
+       COALESCE(a.total_usage_hours, 0) AS total_usage_hours,
+       COALESCE(a.power_rating_w, 0) AS "Power_Rating_W",
+       COALESCE(a.units_per_hour_kwh, 0) AS "Units_Consumed_Per_Hour_kWh",
+       t.base_tariff AS "Base Tariff (cents/kWh)",
+       t.final_unit_cost AS "Final Per Unit Cost (cents/kWh)"
+FROM users u
+JOIN bills b ON b.consumer_number = u.consumer_number
+LEFT JOIN (
+    SELECT ap.consumer_number,
+           SUM(ap.usage_hours) AS total_usage_hours,
+           AVG(COALESCE(c.power_rating_w, 0)) AS power_rating_w,
+           AVG(COALESCE(c.units_per_hour_kwh, 0)) AS units_per_hour_kwh
+    FROM appliances ap
+    LEFT JOIN appliance_catalog c ON c.appliance_name = LOWER(TRIM(ap.appliance_name))
+    GROUP BY ap.consumer_number
+) a ON a.consumer_number = u.consumer_number
+LEFT JOIN (
+    SELECT DISTINCT ON (location) location, base_tariff, final_unit_cost
+    FROM tariffs
+    ORDER BY location, id
+) t ON t.location = LOWER(TRIM(u.location))
+"""
+
+
+def _drop_feature_views():
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS consumer_features")
+    op.execute("DROP VIEW IF EXISTS consumer_features_live")
+
+
+def _create_feature_views():
+    op.execute(LIVE_VIEW_SQL)
+    op.execute("CREATE MATERIALIZED VIEW consumer_features AS SELECT * FROM consumer_features_live")
+    op.execute("CREATE UNIQUE INDEX ix_consumer_features_consumer_month ON consumer_features (consumer_number, month)")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+
+    # Bills are user data: refuse to guess rather than silently drop rows
+    bad = conn.execute(sa.text(f"""
+        SELECT consumer_number, month FROM bills WHERE ({MONTH_TO_DATE}) IS NULL
+        UNION ALL
+        SELECT consumer_number, MIN(month) FROM bills
+        GROUP BY consumer_number, ({MONTH_TO_DATE}) HAVING COUNT(*) > 1
+        LIMIT 20
+    """)).fetchall()
+    if bad:
+        raise RuntimeError(
+            "bills.month has values that are unparseable or collide after normalisation; "
+            f"fix these rows and rerun: {[tuple(row) for row in bad]}"
+        )
+
+    # Predictions are derived and get rescored, so unusable rows are dropped
+    op.execute(f"DELETE FROM predictions WHERE ({MONTH_TO_DATE}) IS NULL")
+    op.execute(f"""
+        DELETE FROM predictions p
+        USING (
+            SELECT ctid, ROW_NUMBER() OVER (PARTITION BY consumer_number, ({MONTH_TO_DATE}) ORDER BY month) AS n
+            FROM predictions
+        ) d
+        WHERE p.ctid = d.ctid AND d.n > 1
+    """)
+
+    _drop_feature_views()
+    for table in ('bills', 'predictions'):
+        op.alter_column(table, 'month', type_=sa.Date(), existing_type=sa.String(), existing_nullable=False,
+                        postgresql_using=MONTH_TO_DATE)
+
+    # The (consumer_number, month) primary keys already serve "latest N months
+    # for a consumer"; these serve "every consumer for month M" and month ranges.
+    op.create_index('ix_bills_month_consumer_number', 'bills', ['month', 'consumer_number'], unique=False)
+    op.create_index('ix_predictions_month_consumer_number', 'predictions', ['month', 'consumer_number'], unique=False)
+    _create_feature_views()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _drop_feature_views()
+    op.drop_index('ix_predictions_month_consumer_number', table_name='predictions')
+    op.drop_index('ix_bills_month_consumer_number', table_name='bills')
+    for table in ('bills', 'predictions'):
+        op.alter_column(table, 'month', type_=sa.String(), existing_type=sa.Date(), existing_nullable=False,
+                        postgresql_using="to_char(month, 'YYYY-MM')")
+    _create_feature_views()
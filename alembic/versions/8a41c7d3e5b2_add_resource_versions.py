@@ -0,0 +1,73 @@
+"""add per-consumer resource versions for conditional GETs
+
+Revision ID: 8a41c7d3e5b2
+Revises: 5d2f8a6c9e31
+Create Date: 2026-10-18 21:03:55.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a41c7d3e5b2'
+down_revision: Union[str, None] = '5d2f8a6c9e31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RESOURCES = ('bills', 'appliances', 'predictions')
+
+# Statement-level triggers with transition tables: one version bump per
+# consumer per statement, so a batch upsert of 100k predictions costs one
+# extra INSERT ... SELECT DISTINCT rather than 100k row triggers. Every writer
+# (API, batch scoring, psql) keeps the stamps current.
+BUMP_FUNCTION_SQL = """
+CREATE FUNCTION bump_resource_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO resource_versions (consumer_number, resource, version, modified_at)
+    SELECT DISTINCT consumer_number, TG_ARGV[0], 1, now() FROM changed_rows
+    ON CONFLICT (consumer_number, resource)
+    DO UPDATE SET version = resource_versions.version + 1, modified_at = EXCLUDED.modified_at;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TRIGGER_EVENTS = (('ins', 'INSERT', 'NEW'), ('upd', 'UPDATE', 'NEW'), ('del', 'DELETE', 'OLD'))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('resource_versions',
+    sa.Column('consumer_number', sa.Integer(), nullable=False),
+    sa.Column('resource', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('modified_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('consumer_number', 'resource')
+    )
+    for resource in RESOURCES:
+        op.execute(f"""
+            INSERT INTO resource_versions (consumer_number, resource, version)
+            SELECT DISTINCT consumer_number, '{resource}', 1 FROM {resource}
+        """)
+
+    op.execute(BUMP_FUNCTION_SQL)
+    for resource in RESOURCES:
+        for suffix, event, table in TRIGGER_EVENTS:
+            op.execute(f"""
+                CREATE TRIGGER {resource}_version_{suffix}
+                AFTER {event} ON {resource}
+                REFERENCING {table} TABLE AS changed_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_resource_version('{resource}')
+            """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for resource in RESOURCES:
+        for suffix, _, _ in TRIGGER_EVENTS:
+            op.execute(f"DROP TRIGGER IF EXISTS {resource}_version_{suffix} ON {resource}")
+    op.execute("DROP FUNCTION IF EXISTS bump_resource_version()")
+    op.drop_table('resource_versions')
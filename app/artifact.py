@@ -0,0 +1,226 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import xgboost as xgb
+from sklearn.ensemble import RandomForestRegressor
+
+# -----------------------------------------------
+# 📦 NATIVE MODEL ARTIFACT
+# -----------------------------------------------
+# Serving-side layout of the stacked model, so a process can load it without
+# unpickling the whole StackingRegressor:
+#
+#   manifest.json                current version, features, and how to read each part
+#   <version>/<name>.ubj         XGBoost booster in its native binary format
+#   <version>/<name>.<field>.npy RandomForest trees flattened into one node table
+#
+# The forest arrays are opened with mmap_mode='r', so every API worker maps
+# the same page-cache pages instead of holding a private copy, and loading
+# costs a few file opens. They are stored in the dtypes prediction indexes
+# with (intp ids, children_left/children_right interleaved as one
+# (n_nodes, 2) `children` table), so nothing is converted into private memory
+# after mapping. Leaves point at themselves, which lets prediction walk all
+# trees for a block of rows with a fixed number of vectorized steps. Missing
+# values follow each node's `missing_go_to_left`, as in sklearn's trees.
+#
+# A save writes a fresh version directory and then swaps manifest.json in
+# with os.replace, so readers never see a half-written artifact. The previous
+# version is kept until the next save for processes still mapping it.
+# Training writes the pickle first and the manifest last, so the artifact is
+# only current while its manifest is at least as new as the pickle; a pickle
+# replaced by something else (e.g. the older train*.py scripts) wins.
+
+FORMAT = 2  # 2: forests store missing_go_to_left
+MANIFEST = "manifest.json"
+FOREST_FIELDS = ("roots", "children", "feature", "threshold", "missing_go_to_left", "value")
+FOREST_BLOCK = 1 << 16  # trees x rows walked per vectorized step (keeps the working set in cache)
+
+
+class NativeForest:
+    """RandomForestRegressor.predict over the flattened node table."""
+
+    def __init__(self, arrays, max_depth):
+        for field in FOREST_FIELDS:
+            setattr(self, field, arrays[field])
+        self.max_depth = max_depth
+
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        children = self.children.reshape(-1)  # node i's left child at 2i, right child at 2i + 1
+        out = np.empty(len(X), dtype=np.float64)
+        block = max(1, FOREST_BLOCK // len(self.roots))
+        for start in range(0, len(X), block):
+            rows = X[start:start + block]
+            flat = rows.reshape(-1)
+            has_missing = np.isnan(flat).any()
+            row_offsets = (np.arange(len(rows), dtype=np.intp) * X.shape[1])[None, :]
+            node = np.repeat(self.roots[:, None], len(rows), axis=1)  # (trees, rows)
+            for _ in range(self.max_depth):
+                # Same test as sklearn's tree: left when x <= threshold, NaN where the node sends it
+                x = flat[row_offsets + self.feature[node]]
+                go_right = ~(x <= self.threshold[node])
+                if has_missing:
+                    missing = np.isnan(x)
+                    go_right[missing] = ~self.missing_go_to_left[node[missing]]
+                node = children[2 * node + go_right]
+            out[start:start + len(rows)] = self.value[node].mean(axis=0)
+        return out
+
+
+def best_rounds(booster):
+    """`iteration_range` covering the booster's best round when early stopping recorded one (else all rounds)."""
+    best = booster.attr("best_iteration")
+    return (0, int(best) + 1) if best is not None else (0, 0)
+
+
+class NativeBooster:
+    def __init__(self, path):
+        self.booster = xgb.Booster(model_file=path)
+        self.iteration_range = best_rounds(self.booster)
+
+    def predict(self, X):
+        return self.booster.inplace_predict(X, iteration_range=self.iteration_range)
+
+
+class NativeStack:
+    """The saved stack: base models feed the final estimator column by column."""
+
+    def __init__(self, features, bases, final, version):
+        self.feature_names_in_ = np.asarray(features, dtype=object)
+        self.bases = bases
+        self.final = final
+        self.version = version
+
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        base = np.column_stack([est.predict(X) for _, est in self.bases])
+        return self.final.predict(np.ascontiguousarray(base, dtype=np.float32))
+
+
+# ---------- saving ----------
+
+def supports(model):
+    """Whether `model` is a stack this format can hold (XGBoost/RandomForest parts, predict stacking)."""
+    estimators = getattr(model, "estimators_", None)
+    final = getattr(model, "final_estimator_", None)
+    if estimators is None or final is None or getattr(model, "passthrough", False):
+        return False
+    if any(method != "predict" for method in model.stack_method_):
+        return False
+    return all(isinstance(est, (xgb.XGBRegressor, RandomForestRegressor)) for est in [*estimators, final])
+
+
+def flatten_forest(forest):
+    """Concatenate the trees' node arrays, with child ids made global and leaves pointing at themselves."""
+    trees = [est.tree_ for est in forest.estimators_]
+    sizes = np.array([tree.node_count for tree in trees])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    index = np.concatenate([np.arange(n) + offset for n, offset in zip(sizes, offsets)])
+    left = np.concatenate([tree.children_left + offset for tree, offset in zip(trees, offsets)])
+    right = np.concatenate([tree.children_right + offset for tree, offset in zip(trees, offsets)])
+    leaf = np.concatenate([tree.children_left == -1 for tree in trees])
+    feature = np.concatenate([tree.feature for tree in trees])
+    arrays = {
+        "roots": offsets.astype(np.intp),
+        "children": np.column_stack([np.where(leaf, index, left), np.where(leaf, index, right)]).astype(np.intp),
+        "feature": np.where(leaf, 0, feature).astype(np.intp),
+        "threshold": np.concatenate([tree.threshold for tree in trees]),
+        "missing_go_to_left": np.concatenate([tree.missing_go_to_left for tree in trees]).astype(bool),
+        "value": np.concatenate([tree.value[:, 0, 0] for tree in trees]),
+    }
+    return arrays, max(tree.max_depth for tree in trees)
+
+
+def _save_part(name, est, directory):
+    if isinstance(est, xgb.XGBRegressor):
+        filename = f"{name}.ubj"
+        est.get_booster().save_model(os.path.join(directory, filename))
+        return {"name": name, "kind": "xgboost", "file": filename}
+    arrays, max_depth = flatten_forest(est)
+    files = {}
+    for field, array in arrays.items():
+        files[field] = f"{name}.{field}.npy"
+        np.save(os.path.join(directory, files[field]), array)
+    return {"name": name, "kind": "forest", "n_trees": len(est.estimators_), "max_depth": int(max_depth),
+            "files": files}
+
+
+def save_native(model, path):
+    """Write `model` as a new version under `path` and make it current."""
+    os.makedirs(path, exist_ok=True)
+    version = f"v{time.time_ns():x}"
+    directory = os.path.join(path, version)
+    os.makedirs(directory)
+    names = [name for name, _ in model.estimators]
+    manifest = {
+        "format": FORMAT,
+        "version": version,
+        "features": [str(name) for name in model.feature_names_in_],
+        "bases": [_save_part(name, est, directory) for name, est in zip(names, model.estimators_)],
+        "final": _save_part("final", model.final_estimator_, directory),
+    }
+    previous = read_manifest(path)
+    tmp = os.path.join(path, MANIFEST + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(path, MANIFEST))
+
+    keep = {version, previous["version"] if previous else None}
+    for entry in os.listdir(path):
+        if entry not in keep and os.path.isdir(os.path.join(path, entry)):
+            shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+
+def remove_native(path):
+    """Retire the artifact (e.g. when the model can't be stored natively) so servers fall back to the pickle."""
+    try:
+        os.remove(os.path.join(path, MANIFEST))
+    except FileNotFoundError:
+        pass
+
+
+# ---------- loading ----------
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def is_current(path, model_path):
+    """Whether the artifact at `path` is readable by this version and not older than the pickle at `model_path`."""
+    try:
+        saved_at = os.stat(os.path.join(path, MANIFEST)).st_mtime_ns
+    except FileNotFoundError:
+        return False
+    try:
+        if os.stat(model_path).st_mtime_ns > saved_at:
+            return False
+    except FileNotFoundError:
+        pass
+    manifest = read_manifest(path)
+    return manifest is not None and manifest.get("format") == FORMAT
+
+
+def _load_part(part, directory):
+    if part["kind"] == "xgboost":
+        return NativeBooster(os.path.join(directory, part["file"]))
+    arrays = {field: np.load(os.path.join(directory, filename), mmap_mode='r')
+              for field, filename in part["files"].items()}
+    return NativeForest(arrays, part["max_depth"])
+
+
+def load_native(path):
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(os.path.join(path, MANIFEST))
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"Unsupported model artifact format {manifest.get('format')!r} in {path}")
+    directory = os.path.join(path, manifest["version"])
+    bases = [(part["name"], _load_part(part, directory)) for part in manifest["bases"]]
+    return NativeStack(manifest["features"], bases, _load_part(manifest["final"], directory), manifest["version"])
@@ -0,0 +1,71 @@
+import json
+import os
+
+import numpy as np
+
+# -----------------------------------------------
+# 🧮 FEATURE ENCODER
+# -----------------------------------------------
+# Fitted on the training features and saved next to the model, so scoring
+# builds the model input the same way on every run: columns in training
+# order, missing values filled with the training medians, and features the
+# scoring source does not provide left at 0.
+
+
+class FeatureEncoder:
+    def __init__(self, features, fill_values=None):
+        self.features = list(features)
+        fill_values = fill_values or {}
+        self.fill_values = np.array([fill_values.get(name, 0.0) for name in self.features], dtype=np.float32)
+        self._index = {name: j for j, name in enumerate(self.features)}
+
+    @classmethod
+    def fit(cls, X):
+        medians = X.median(numeric_only=True)
+        return cls(X.columns, {name: float(value) for name, value in medians.items()})
+
+    @classmethod
+    def from_model(cls, model):
+        """Encoder for artifacts saved before encoders existed: training order, no fill values."""
+        return cls(model.feature_names_in_)
+
+    def transform(self, frame):
+        """Map a DataFrame into a preallocated float32 matrix in one column-wise pass."""
+        X = np.zeros((len(frame), len(self.features)), dtype=np.float32)
+        for j, name in enumerate(self.features):
+            if name in frame.columns:
+                X[:, j] = frame[name].to_numpy(dtype=np.float32, na_value=self.fill_values[j])
+        return X
+
+    def transform_records(self, rows):
+        """Same as `transform` for a few dicts, without building a DataFrame."""
+        X = np.zeros((len(rows), len(self.features)), dtype=np.float32)
+        for i, row in enumerate(rows):
+            for name, value in row.items():
+                j = self._index.get(name)
+                if j is not None:
+                    X[i, j] = self.fill_values[j] if value is None or value != value else value
+        return X
+
+    # ---------- persistence ----------
+
+    def to_dict(self):
+        return {
+            "features": self.features,
+            "fill_values": {name: float(v) for name, v in zip(self.features, self.fill_values)},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["features"], data.get("fill_values"))
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
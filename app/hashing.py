@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+# -----------------------------------------------
+# 🔐 PASSWORD HASHING POOL
+# -----------------------------------------------
+# bcrypt is deliberately CPU-heavy. Hashing and verification run on a small
+# dedicated process pool so sign-in bursts can't take every core from the API,
+# and a bounded number of in-flight jobs gives callers backpressure instead of
+# an unbounded queue.
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+HASH_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+MAX_IN_FLIGHT = HASH_WORKERS * 8
+ACQUIRE_TIMEOUT = 5.0  # seconds a request waits for a free slot before giving up
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _hash(password):
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    def __init__(self, max_workers=HASH_WORKERS, max_in_flight=MAX_IN_FLIGHT, acquire_timeout=ACQUIRE_TIMEOUT):
+        self.max_workers = max_workers
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # Not fork: the pool starts lazily, after the job-queue and model-watcher
+                # threads are running and the model is loaded, and children only need passlib
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("forkserver"))
+            return self._pool
+
+    def _submit(self, fn, *args, timeout=None):
+        if not self._slots.acquire(timeout=timeout):
+            raise HashingBusy()
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hash(self, password):
+        return self._submit(_hash, password, timeout=self.acquire_timeout).result()
+
+    def verify(self, plain_password, hashed_password):
+        return self._submit(_verify, plain_password, hashed_password, timeout=self.acquire_timeout).result()
+
+    def hash_many(self, passwords):
+        """Hash a batch across all workers; waits for slots rather than failing."""
+        futures = [self._submit(_hash, password) for password in passwords]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,236 @@
+import heapq
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# -----------------------------------------------
+# ⏳ BACKGROUND JOB QUEUE
+# -----------------------------------------------
+# Request handlers used to run training/scoring inline, holding the worker for
+# the whole run. Jobs are now queued here and executed by a fixed number of
+# worker threads. Submissions sharing a key (the consumer number) that arrive
+# while a job for that key is still pending are merged into that job.
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED, TIMED_OUT}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobTimeout(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key, fn, timeout, run_at):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.fn = fn
+        self.timeout = timeout
+        self.run_at = run_at
+        self.status = PENDING
+        self.merged = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+
+    @property
+    def deadline(self):
+        if self.started_at is None or not self.timeout:
+            return None
+        return self.started_at + self.timeout
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        """Cooperative checkpoint for long-running job functions."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        deadline = self.deadline
+        if deadline is not None and time.time() > deadline:
+            raise JobTimeout()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "key": self.key,
+            "status": self.status,
+            "merged": self.merged,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timeout": self.timeout,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+def run_subprocess(job, cmd, poll_interval=0.5):
+    """Run `cmd` as a child process, killing it if the job is cancelled or times out."""
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        while True:
+            try:
+                stdout, stderr = proc.communicate(timeout=poll_interval)
+                break
+            except subprocess.TimeoutExpired:
+                job.check()
+    except (JobCancelled, JobTimeout):
+        proc.kill()
+        proc.communicate()
+        raise
+    print("STDOUT:", stdout)
+    print("STDERR:", stderr)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{cmd} exited with status {proc.returncode}")
+    return proc.returncode
+
+
+class JobQueue:
+    def __init__(self, max_workers=2, debounce_seconds=5.0, default_timeout=900.0, max_history=1000):
+        self.max_workers = max_workers
+        self.debounce_seconds = debounce_seconds
+        self.default_timeout = default_timeout
+        self.max_history = max_history
+
+        self._jobs = OrderedDict()  # job_id -> Job
+        self._pending_by_key = {}  # key -> Job still waiting to run
+        self._heap = []  # (run_at, seq, job_id)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._workers = []
+        self._stopping = False
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        with self._cond:
+            if self._workers:
+                return
+            self._stopping = False
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._stopping = True
+            for job in self._pending_by_key.values():
+                job._cancel.set()
+            self._cond.notify_all()
+            workers, self._workers = self._workers, []
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    # ---------- public API ----------
+
+    def submit(self, key, fn, timeout=None):
+        """Queue `fn(job)` for `key`, merging into a pending job for the same key."""
+        self.start()
+        with self._cond:
+            job = self._pending_by_key.get(key)
+            if job is not None and job.status == PENDING:
+                job.fn = fn
+                job.merged += 1
+                return job
+
+            job = Job(key, fn, timeout or self.default_timeout, time.time() + self.debounce_seconds)
+            self._jobs[job.id] = job
+            self._pending_by_key[key] = job
+            self._seq += 1
+            heapq.heappush(self._heap, (job.run_at, self._seq, job.id))
+            self._trim_history()
+            self._cond.notify()
+            return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return job
+            job._cancel.set()
+            if job.status == PENDING:
+                self._finish(job, CANCELLED)
+            return job
+
+    # ---------- internals ----------
+
+    def _trim_history(self):
+        while len(self._jobs) > self.max_history:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status not in FINISHED_STATES:
+                break
+            del self._jobs[oldest_id]
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        if self._pending_by_key.get(job.key) is job:
+            del self._pending_by_key[job.key]
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                run_at, _, job_id = self._heap[0]
+                delay = run_at - time.time()
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+                heapq.heappop(self._heap)
+                job = self._jobs.get(job_id)
+                if job is None or job.status != PENDING:
+                    continue
+                job.status = RUNNING
+                job.started_at = time.time()
+                if self._pending_by_key.get(job.key) is job:
+                    del self._pending_by_key[job.key]
+                return job
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                job.check()
+                # Once fn returns its work is done (and possibly committed): report it,
+                # even past the deadline. Long jobs enforce the timeout via job.check()
+                result = job.fn(job)
+            except JobCancelled:
+                status, result, error = CANCELLED, None, None
+            except JobTimeout:
+                status, result, error = TIMED_OUT, None, f"Job exceeded {job.timeout}s"
+            except Exception as exc:
+                status, result, error = FAILED, None, repr(exc)
+            else:
+                status, error = SUCCEEDED, None
+            with self._cond:
+                self._finish(job, status, result, error)
@@ -1,13 +1,29 @@
-from fastapi import FastAPI, Depends, HTTPException,APIRouter
+from fastapi import FastAPI, Depends, HTTPException,APIRouter, Query, Request, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import JSON, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
 import jwt
+import base64
 import datetime
-import subprocess  
+import hashlib
+import threading
+from email.utils import format_datetime, parsedate_to_datetime
 from app.schemas import  PredictionResponse
-from app.database import SessionLocal, engine, get_db  
+from app.database import AsyncSessionLocal, SessionLocal, engine, get_db, get_async_db, pool_stats
+from app.cache import TTLCache
+from app.config import ADMIN_EMAILS
+from app.hashing import HashingBusy, password_hasher
+from app.jobs import JobQueue, run_subprocess
+from app.model_server import model_server
+from app.responses import FastJSONResponse, columns_for, ndjson_line, rows_to_dicts
+from app.scoring import prediction_cache, score_bills, score_consumer
 from . import models, schemas
 from sqlalchemy.sql import text
 
@@ -26,8 +42,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ✅ Password hashing setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# ✅ Password hashing runs on a bounded process pool (see app/hashing.py)
+@app.exception_handler(HashingBusy)
+def hashing_busy_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please retry"}, headers={"Retry-After": "1"})
 
 # ✅ JWT Authentication
 SECRET_KEY = "your_secret_key"  # Change this to a secure value
@@ -35,15 +53,33 @@ ALGORITHM = "HS256"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 security = HTTPBearer()
 
+# ✅ Auth fast path: decoded tokens and user rows are cached per process
+token_cache = TTLCache(maxsize=10000, ttl=300.0)  # token -> (email, exp)
+user_cache = TTLCache(maxsize=10000, ttl=60.0)  # email -> detached User copy
+
+# ✅ Background jobs (training/scoring never runs inside a request)
+job_queue = JobQueue(max_workers=2, debounce_seconds=5.0, default_timeout=900.0)
+
+@app.on_event("startup")
+def start_background_services():
+    job_queue.start()
+    model_server.start()  # ✅ Load the model once and keep it resident (hot-reloads on change)
+
+@app.on_event("shutdown")
+def stop_background_services():
+    job_queue.shutdown(wait=False)
+    model_server.stop()
+    password_hasher.shutdown()
+
 # -----------------------------------------------
 # 🔐 UTILITY FUNCTIONS
 # -----------------------------------------------
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify(plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: datetime.timedelta = None):
     to_encode = data.copy()
@@ -51,34 +87,280 @@ def create_access_token(data: dict, expires_delta: datetime.timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    token = credentials.credentials
+def _detached_user(user):
+    """Session-free copy of a User row that is safe to share between requests."""
+    return models.User(**{c.key: getattr(user, c.key) for c in models.User.__table__.columns})
+
+def invalidate_user(email):
+    user_cache.pop(email)
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    invalidate_user(target.email)
+
+def _token_email(token):
+    """Email for a bearer token, from the token cache or by decoding the JWT."""
+    cached = token_cache.get(token)
+    if cached:
+        email, exp = cached
+        if exp <= datetime.datetime.now(datetime.timezone.utc).timestamp():
+            token_cache.pop(token)
+            raise HTTPException(status_code=401, detail="Token expired")
+        return email
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload["sub"]
-        user = db.query(models.User).filter(models.User.email == email).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user  # ✅ Return full user object
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
-def run_training():
-    result = subprocess.run(["python", "scripts/train11.py"], capture_output=True, text=True)
-    print("STDOUT:", result.stdout)
-    print("STDERR:", result.stderr)
+    email, exp = payload["sub"], payload["exp"]
+    # Never keep a token in the cache past its own expiry
+    token_cache.set(token, (email, exp), ttl=exp - datetime.datetime.now(datetime.timezone.utc).timestamp())
+    return email
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+    email = _token_email(credentials.credentials)
+    user = user_cache.get(email)
+    if user is None:
+        db_user = db.query(models.User).filter(models.User.email == email).first()
+        if not db_user:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = _detached_user(db_user)
+        user_cache.set(email, user)
+    return user  # ✅ Return full user object
+
+def is_admin(user):
+    return user.email.lower() in ADMIN_EMAILS
+
+def get_admin_user(user=Depends(get_current_user)):
+    """The current user, if listed in ADMIN_EMAILS; bulk routes that act for other accounts need it."""
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+async def get_current_user_async(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
+    email = _token_email(credentials.credentials)
+    user = user_cache.get(email)
+    if user is None:
+        result = await db.execute(select(models.User).where(models.User.email == email))
+        db_user = result.scalars().first()
+        if not db_user:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = _detached_user(db_user)
+        user_cache.set(email, user)
+    return user
+training_lock = threading.Lock()  # train11.py writes fixed temp paths, so runs must not overlap
+
+def run_training(job):
+    with training_lock:
+        try:
+            # Same box as the API: niced, on a small share of the cores
+            return run_subprocess(job, ["python", "scripts/train11.py", "--profile", "background"])
+        finally:
+            prediction_cache.clear()  # the batch run rescored everyone in another process
+
+def score_consumer_now(consumer_number, months=None):
+    """Score in a fresh sync session; lets async routes push the work to a thread."""
+    db = SessionLocal()
+    try:
+        return score_consumer(db, consumer_number, months=months)
+    finally:
+        db.close()
+
+def score_consumer_job(consumer_number):
+    def run(job):
+        db = SessionLocal()
+        try:
+            job.check()
+            return len(score_consumer(db, consumer_number, check=job.check))
+        except FileNotFoundError:
+            # No model artifact yet: the single "train" job trains one and scores everyone
+            return {"train_job": job_queue.submit("train", run_training).id}
+        finally:
+            db.close()
+    return run
+
+def enqueue_scoring(consumer_number, response: Response = None):
+    job = job_queue.submit(consumer_number, score_consumer_job(consumer_number))
+    if response is not None:
+        response.headers["X-Job-Id"] = job.id
+    return job
     # ✅ Function to check if both bills and appliances exist
 def should_train(user, db):
     has_bills = db.query(models.Bill).filter(models.Bill.consumer_number == user.consumer_number).count() > 0
     has_appliances = db.query(models.Appliance).filter(models.Appliance.consumer_number == user.consumer_number).count() > 0
     return has_bills and has_appliances
+
+async def should_train_async(user, db: AsyncSession):
+    has_bills = (await db.execute(
+        select(models.Bill.month).where(models.Bill.consumer_number == user.consumer_number).limit(1)
+    )).first() is not None
+    has_appliances = (await db.execute(
+        select(models.Appliance.appliance_name).where(models.Appliance.consumer_number == user.consumer_number).limit(1)
+    )).first() is not None
+    return has_bills and has_appliances
+
+def unique_appliances(consumer_number, appliance_list):
+    """The posted appliances as row dicts for this consumer; the last entry wins for a repeated name."""
+    rows = {
+        appliance.appliance_name: {
+            "consumer_number": consumer_number,
+            "appliance_name": appliance.appliance_name,
+            "usage_hours": appliance.usage_hours,
+        }
+        for appliance in appliance_list.appliances
+    }
+    return list(rows.values())
+
+def upsert_appliances(appliances):
+    """One INSERT ... ON CONFLICT for the whole list, returning only rows that were inserted or actually changed."""
+    stmt = insert(models.Appliance).values(appliances)
+    return stmt.on_conflict_do_update(
+        index_elements=[models.Appliance.consumer_number, models.Appliance.appliance_name],
+        set_={"usage_hours": stmt.excluded.usage_hours},
+        where=models.Appliance.usage_hours.is_distinct_from(stmt.excluded.usage_hours),
+    ).returning(models.Appliance.appliance_name)
+
+def in_month_range(stmt, column, from_month=None, to_month=None):
+    """Narrow `stmt` to an inclusive month range (one index range scan)."""
+    if from_month is not None:
+        stmt = stmt.where(column >= from_month)
+    if to_month is not None:
+        stmt = stmt.where(column <= to_month)
+    return stmt
+
+# -----------------------------------------------
+# 📄 PAGINATION & STREAMING
+# -----------------------------------------------
+# List routes are keyset-paginated on (consumer_number, <key>): the consumer
+# is fixed by auth, so a page is one primary-key range scan starting after
+# the `after` cursor, whatever page the client is on. The cursor for the next
+# page comes back in the X-Next-Cursor header. `stream=true` instead writes
+# NDJSON, pulling rows from a server-side cursor in batches.
+
+PAGE_SIZE_MAX = 1000
+STREAM_BATCH_SIZE = 500
+
+def encode_cursor(key):
+    """Opaque, header-safe cursor for a page key (keys can be user-entered, non-latin-1 text)."""
+    return base64.urlsafe_b64encode(str(key).encode()).rstrip(b"=").decode("ascii")
+
+def decode_cursor(cursor):
+    return base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode()
+
+class Page:
+    def __init__(
+        self,
+        after: Optional[str] = None,
+        limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+        stream: bool = False,
+    ):
+        self.after = after
+        self.limit = limit
+        self.stream = stream
+
+    def cursor(self, parse=str):
+        if self.after is None:
+            return None
+        try:
+            # binascii.Error and UnicodeDecodeError are ValueErrors too
+            return parse(decode_cursor(self.after))
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"Invalid cursor: {self.after!r}")
+
+    def apply(self, stmt, key_column, parse=str):
+        """Rows after the cursor in key order; one extra row tells us whether a next page exists."""
+        after = self.cursor(parse)
+        if after is not None:
+            stmt = stmt.where(key_column > after)
+        stmt = stmt.order_by(key_column)
+        if self.limit is not None:
+            stmt = stmt.limit(self.limit if self.stream else self.limit + 1)
+        return stmt
+
+    def finish(self, rows, key, response: Response):
+        if self.limit is not None and len(rows) > self.limit:
+            rows = rows[:self.limit]
+            response.headers["X-Next-Cursor"] = encode_cursor(key(rows[-1]))
+        return rows
+
+def stream_ndjson(stmt, response: Response = None):
+    # Own session: the request's session is closed before the body is sent
+    def lines():
+        with SessionLocal() as db:
+            for row in db.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE)):
+                yield ndjson_line(row)
+    headers = dict(response.headers) if response is not None else None
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+def stream_ndjson_async(stmt, response: Response = None):
+    async def lines():
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+            async for row in result:
+                yield ndjson_line(row)
+    headers = dict(response.headers) if response is not None else None
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+def list_response(rows, response: Response):
+    """Column tuples straight to JSON; skips ORM instances and response_model validation."""
+    return FastJSONResponse(rows_to_dicts(rows), headers=dict(response.headers))
+
+# -----------------------------------------------
+# 🏷️ CONDITIONAL GET (ETag / Last-Modified)
+# -----------------------------------------------
+# Every write to bills, appliances or predictions bumps that consumer's row in
+# resource_versions (database triggers, see migration 8a41c7d3e5b2). Reads look
+# the stamp up by primary key first and answer 304 without loading any rows
+# when the client already has that version. The stamp is read before the rows,
+# so a write racing the read can only make the ETag older than the body,
+# which costs the client one extra 200 later, never a stale 304.
+
+def version_query(consumer_number, resource):
+    return select(models.ResourceVersion.version, models.ResourceVersion.modified_at).where(
+        models.ResourceVersion.consumer_number == consumer_number,
+        models.ResourceVersion.resource == resource,
+    )
+
+def not_modified(request: Request, response: Response, consumer_number, resource, stamp):
+    """Set ETag/Last-Modified from `stamp` and return a 304 if the client's copy is current."""
+    if stamp is None:
+        return None  # nothing written yet (or not migrated): serve normally
+    version, modified_at = stamp
+    # Query parameters (month range, page, stream) select different bodies of the same version
+    variant = hashlib.blake2b(str(request.query_params).encode(), digest_size=4).hexdigest()
+    etag = f'"{resource}-{consumer_number}-{version}-{variant}"'
+    modified_at = modified_at.astimezone(datetime.timezone.utc)
+    headers = {"ETag": etag, "Last-Modified": format_datetime(modified_at, usegmt=True), "Cache-Control": "no-cache"}
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    else:
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+            fresh = modified_at.replace(microsecond=0) <= since
+        except (KeyError, TypeError, ValueError):
+            fresh = False
+    return Response(status_code=304, headers=headers) if fresh else None
+
+def prediction_summary(predicted_values):
+    if not predicted_values:
+        return None
+    return {
+        "current_bill": predicted_values["bill_amount"],
+        "shifted_bill": predicted_values["reduced_bill_amount"],
+        "current_carbon": predicted_values["carbon_footprint"],
+        "shifted_carbon": predicted_values["reduced_carbon_footprint"]
+    }
 # -----------------------------------------------
 # 🧑‍💻 USER ROUTES
 # -----------------------------------------------
 
 @app.post("/users/", response_model=schemas.UserResponse)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+def create_user(user: schemas.UserCreate, response: Response, db: Session = Depends(get_db)):
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
@@ -96,12 +378,45 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    invalidate_user(new_user.email)
     if should_train(new_user, db):
-        run_training()
+        enqueue_scoring(new_user.consumer_number, response)
     
     
     return new_user
 
+@app.post("/users/batch", response_model=list[schemas.UserResponse])
+def create_users_batch(batch: schemas.UserBatch, db: Session = Depends(get_db), admin=Depends(get_admin_user)):
+    emails = [user.email for user in batch.users]
+    if len(set(emails)) != len(emails):
+        raise HTTPException(status_code=400, detail="Duplicate emails in batch")
+    existing = db.query(models.User.email).filter(models.User.email.in_(emails)).all()
+    if existing:
+        raise HTTPException(status_code=400, detail=f"Emails already registered: {[row.email for row in existing]}")
+
+    # ✅ Hash in parallel across the pool, then insert everything in one transaction
+    hashed = password_hasher.hash_many([user.password for user in batch.users])
+    db.add_all([
+        models.User(
+            consumer_number=user.consumer_number,
+            name=user.name,
+            email=user.email,
+            hashed_password=hashed_password,
+            family_members=user.family_members,
+            working_members=user.working_members,
+            ages=user.ages,
+            location=user.location,
+        )
+        for user, hashed_password in zip(batch.users, hashed)
+    ])
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Consumer number already registered")
+
+    return [schemas.UserResponse(**user.model_dump(exclude={"password"})) for user in batch.users]
+
 @app.get("/users/by-email/{email}", response_model=schemas.UserResponse)
 def get_user_by_email(email: str, db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.email == email).first()
@@ -137,35 +452,38 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 # -----------------------------------------------
 
 @app.post("/appliances/", response_model=list[schemas.ApplianceResponse])
-def create_appliances(appliance_list: schemas.ApplianceList, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    new_appliances = []
-    for appliance in appliance_list.appliances:
-        new_appliance = models.Appliance(
-            consumer_number=user.consumer_number,
-            appliance_name=appliance.appliance_name,
-            usage_hours=appliance.usage_hours,
-        )
-        db.add(new_appliance)
-        new_appliances.append(new_appliance)
-
+def create_appliances(appliance_list: schemas.ApplianceList, response: Response, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    appliances = unique_appliances(user.consumer_number, appliance_list)
+    if not appliances:
+        return []
+    changed = db.execute(upsert_appliances(appliances)).all()
     db.commit()
-    if should_train(user, db):
-        run_training()
-    return new_appliances
+    # ✅ Re-syncing an unchanged list is a no-op: nothing to rescore
+    if changed and should_train(user, db):
+        enqueue_scoring(user.consumer_number, response)
+    return appliances
 
 @app.get("/appliances/", response_model=list[schemas.ApplianceResponse])
-def get_appliances(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    appliances = db.query(models.Appliance).filter(models.Appliance.consumer_number == user.consumer_number).all()
-    if not appliances:
+def get_appliances(request: Request, response: Response, page: Page = Depends(), db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    stamp = db.execute(version_query(user.consumer_number, "appliances")).first()
+    cached = not_modified(request, response, user.consumer_number, "appliances", stamp)
+    if cached:
+        return cached
+    stmt = select(*columns_for(models.Appliance, schemas.ApplianceResponse)).where(models.Appliance.consumer_number == user.consumer_number)
+    stmt = page.apply(stmt, models.Appliance.appliance_name)
+    if page.stream:
+        return stream_ndjson(stmt, response)
+    appliances = page.finish(db.execute(stmt).all(), lambda a: a.appliance_name, response)
+    if not appliances and page.after is None:
         raise HTTPException(status_code=404, detail="No appliances found for this user")
-    return appliances
+    return list_response(appliances, response)
 
 # -----------------------------------------------
 # 🧾 BILL ROUTES
 # -----------------------------------------------
 
 @app.post("/bills/", response_model=dict)
-def create_bill(bill: schemas.BillCreate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+def create_bill(bill: schemas.BillCreate, response: Response, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
     # Step 1: Create and save the new bill
     new_bill = models.Bill(
         consumer_number=user.consumer_number,
@@ -177,47 +495,149 @@ def create_bill(bill: schemas.BillCreate, db: Session = Depends(get_db), user: m
     db.commit()
     db.refresh(new_bill)
     
+    # Step 2: Score this consumer's new month in-process
+    job = None
+    predicted_values = None
     if should_train(user, db):
-        run_training()
-    # Step 2: Fetch the predicted values directly
-    predicted_values = db.query(models.Prediction).filter(
-        models.Prediction.consumer_number == user.consumer_number,
-        models.Prediction.month == bill.month
-    ).first()
-
-    if not predicted_values:
-        raise HTTPException(status_code=404, detail="No predictions found for the given consumer and month.")
+        try:
+            rows = score_consumer(db, user.consumer_number, months=[bill.month])
+            predicted_values = rows[0] if rows else None
+        except FileNotFoundError:
+            job = enqueue_scoring(user.consumer_number, response)
 
     return {
         "bill": new_bill,
-        "prediction": {
-            "current_bill": predicted_values.bill_amount,
-            "shifted_bill": predicted_values.reduced_bill_amount,
-            "current_carbon": predicted_values.carbon_footprint,
-            "shifted_carbon": predicted_values.reduced_carbon_footprint
-        }
+        "prediction": prediction_summary(predicted_values),
+        "job_id": job.id if job else None,
     }
 
 
+@app.post("/bills/batch", response_model=dict)
+def create_bills_batch(batch: schemas.BillBatch, response: Response, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    # ✅ Only an admin may write other consumers' bills; for anyone else every row is theirs,
+    # like POST /bills/ ignoring the body's consumer number
+    admin = is_admin(user)
+    def owner(bill):
+        return bill.consumer_number if admin else user.consumer_number
+
+    # ✅ Last value wins for repeated (consumer, month) pairs, as it would with one-by-one posts
+    rows = {(owner(bill), bill.month): bill for bill in batch.bills}
+    if not rows:
+        raise HTTPException(status_code=400, detail="No bills in batch")
+    consumers = {consumer_number for consumer_number, _ in rows}
+    known = set(db.scalars(select(models.User.consumer_number).where(models.User.consumer_number.in_(consumers))))
+    if consumers - known:
+        raise HTTPException(status_code=400, detail=f"Unknown consumer numbers: {sorted(consumers - known)}")
+
+    # Step 1: One multi-row upsert on the (consumer_number, month) primary key
+    stmt = insert(models.Bill).values([
+        {
+            "consumer_number": consumer_number,
+            "month": month,
+            "units_consumed": bill.units_consumed,
+            "cost_per_unit": bill.cost_per_unit,
+        }
+        for (consumer_number, month), bill in rows.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.Bill.consumer_number, models.Bill.month],
+        set_={"units_consumed": stmt.excluded.units_consumed, "cost_per_unit": stmt.excluded.cost_per_unit},
+    ))
+    db.commit()
+
+    # Step 2: One scoring pass over every affected consumer that has appliances
+    scorable = set(db.scalars(
+        select(models.Appliance.consumer_number).where(models.Appliance.consumer_number.in_(consumers)).distinct()
+    ))
+    job = None
+    predictions = []
+    try:
+        predictions = score_bills(db, [key for key in rows if key[0] in scorable])
+    except FileNotFoundError:
+        # No model artifact yet: one training run scores everyone
+        job = job_queue.submit("train", run_training)
+        response.headers["X-Job-Id"] = job.id
+
+    return {
+        "bills": len(rows),
+        "predictions": [schemas.PredictionResponse.model_validate(row) for row in predictions],
+        "job_id": job.id if job else None,
+    }
+
 @app.get("/bills/", response_model=list[schemas.BillResponse])
-def get_bills(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    bills = db.query(models.Bill).filter(models.Bill.consumer_number == user.consumer_number).all()
-    if not bills:
+def get_bills(request: Request, response: Response, from_month: Optional[schemas.Month] = None, to_month: Optional[schemas.Month] = None, page: Page = Depends(), db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    stamp = db.execute(version_query(user.consumer_number, "bills")).first()
+    cached = not_modified(request, response, user.consumer_number, "bills", stamp)
+    if cached:
+        return cached
+    stmt = select(*columns_for(models.Bill, schemas.BillResponse)).where(models.Bill.consumer_number == user.consumer_number)
+    stmt = page.apply(in_month_range(stmt, models.Bill.month, from_month, to_month), models.Bill.month, schemas.parse_month)
+    if page.stream:
+        return stream_ndjson(stmt, response)
+    bills = page.finish(db.execute(stmt).all(), lambda b: b.month, response)
+    if not bills and page.after is None:
         raise HTTPException(status_code=404, detail="No bills found for this user")
-    return bills
+    return list_response(bills, response)
 
 # -----------------------------------------------
 # 🔮 PREDICTION ROUTES
 # -----------------------------------------------
 
 @app.get("/predictions/", response_model=list[schemas.PredictionResponse])
-def get_predictions(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    predictions = db.query(models.Prediction).filter(models.Prediction.consumer_number == user.consumer_number).all()
+def get_predictions(request: Request, response: Response, from_month: Optional[schemas.Month] = None, to_month: Optional[schemas.Month] = None, page: Page = Depends(), db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    stamp = db.execute(version_query(user.consumer_number, "predictions")).first()
+    cached = not_modified(request, response, user.consumer_number, "predictions", stamp)
+    if cached:
+        return cached
+    stmt = select(*columns_for(models.Prediction, schemas.PredictionResponse)).where(models.Prediction.consumer_number == user.consumer_number)
+    stmt = page.apply(in_month_range(stmt, models.Prediction.month, from_month, to_month), models.Prediction.month, schemas.parse_month)
+    if page.stream:
+        return stream_ndjson(stmt, response)
+    predictions = page.finish(db.execute(stmt).all(), lambda p: p.month, response)
     
-    if not predictions:
+    if not predictions and page.after is None:
         raise HTTPException(status_code=404, detail="No prediction data found for this user")
     
-    return predictions
+    return list_response(predictions, response)
+
+# -----------------------------------------------
+# 🏠 DASHBOARD
+# -----------------------------------------------
+# Everything the home screen needs in one request: the profile comes from the
+# (cached) auth lookup, the rest from a single statement whose subqueries each
+# hit one table's primary key and come back already aggregated as JSON.
+
+DASHBOARD_QUERY = text("""
+    SELECT
+        (SELECT row_to_json(b) FROM (
+            SELECT consumer_number, month, units_consumed, cost_per_unit
+            FROM bills WHERE consumer_number = :consumer_number
+            ORDER BY month DESC LIMIT 1
+        ) b) AS latest_bill,
+        (SELECT COALESCE(json_agg(a ORDER BY a.appliance_name), '[]') FROM (
+            SELECT consumer_number, appliance_name, usage_hours
+            FROM appliances WHERE consumer_number = :consumer_number
+        ) a) AS appliances,
+        (SELECT COALESCE(json_agg(p ORDER BY p.month DESC), '[]') FROM (
+            SELECT consumer_number, month, energy_consumption, reduced_consumption, bill_amount,
+                   reduced_bill_amount, carbon_footprint, reduced_carbon_footprint
+            FROM predictions WHERE consumer_number = :consumer_number
+            ORDER BY month DESC LIMIT :months
+        ) p) AS predictions
+""").columns(latest_bill=JSON, appliances=JSON, predictions=JSON)
+
+def dashboard_payload(user, row):
+    return {
+        "profile": schemas.UserResponse.model_validate(user),
+        "latest_bill": row.latest_bill,
+        "appliances": row.appliances,
+        "predictions": row.predictions,
+    }
+
+@app.get("/dashboard", response_model=schemas.DashboardResponse)
+def get_dashboard(months: int = Query(12, ge=1, le=120), db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    row = db.execute(DASHBOARD_QUERY, {"consumer_number": user.consumer_number, "months": months}).one()
+    return dashboard_payload(user, row)
 
 # -----------------------------------------------
 # 📅 FETCH LATEST MONTH ROUTE (UPDATED)
@@ -228,7 +648,7 @@ def get_latest_month(consumer_number: int, db: Session = Depends(get_db)):
     latest_record = (
         db.query(models.Bill)
         .filter(models.Bill.consumer_number == consumer_number)
-        .order_by(models.Bill.month.desc())  
+        .order_by(models.Bill.month.desc())  # DATE column: chronological, served by the primary key
         .first()
     )
 
@@ -242,19 +662,203 @@ def get_latest_month(consumer_number: int, db: Session = Depends(get_db)):
 # -----------------------------------------------
 
 @app.get("/get_value/{consumer_number}")
-def get_value(consumer_number: int, month: str, db: Session = Depends(get_db)):
-    record = (
-        db.query(models.Prediction)
-        .filter(models.Prediction.consumer_number == consumer_number, models.Prediction.month == month)
-        .first()
+def get_value(request: Request, response: Response, consumer_number: int, month: schemas.Month, db: Session = Depends(get_db)):
+    # ✅ The version stamp is always read (one primary-key lookup): writes from other
+    # workers or the batch script bump it, so a cached value or a 304 is only ever
+    # served for the version that is current in Postgres
+    stamp = db.execute(version_query(consumer_number, "predictions")).first()
+    stamp = tuple(stamp) if stamp else None
+    entry = prediction_cache.get((consumer_number, month))
+    if entry is None or stamp is None or entry[0] != stamp:
+        generation = prediction_cache.generation  # a write landing during the read below voids this entry
+        record = (
+            db.query(models.Prediction)
+            .filter(models.Prediction.consumer_number == consumer_number, models.Prediction.month == month)
+            .first()
+        )
+
+        if not record:
+            raise HTTPException(status_code=404, detail="No data found for the given month and consumer number")
+
+        entry = (stamp, {
+            "current_bill": record.bill_amount,
+            "shifted_bill": record.reduced_bill_amount,
+            "current_carbon": record.carbon_footprint,
+            "shifted_carbon": record.reduced_carbon_footprint
+        })
+        if stamp is not None:  # without a stamp a write elsewhere could not be detected
+            prediction_cache.set((consumer_number, month), entry, generation=generation)
+
+    stamp, values = entry
+    cached = not_modified(request, response, consumer_number, "predictions", stamp)
+    if cached:
+        return cached
+    return values
+
+# -----------------------------------------------
+# ⚡ ASYNC ROUTES (AsyncSession + asyncpg)
+# -----------------------------------------------
+# Same behaviour as the routes above, served under /async without occupying
+# a threadpool thread per request. CPU-bound work (bcrypt, scoring) is still
+# pushed off the event loop.
+
+async_router = APIRouter(prefix="/async")
+
+@async_router.post("/users/", response_model=schemas.UserResponse)
+async def create_user_async(user: schemas.UserCreate, response: Response, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(models.User.email).where(models.User.email == user.email))
+    if result.first():
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    new_user = models.User(
+        consumer_number=user.consumer_number,
+        name=user.name,
+        email=user.email,
+        hashed_password=await run_in_threadpool(hash_password, user.password),
+        family_members=user.family_members,
+        working_members=user.working_members,
+        ages=user.ages,
+        location=user.location,
+    )
+    db.add(new_user)
+    await db.commit()
+    invalidate_user(new_user.email)
+    if await should_train_async(new_user, db):
+        enqueue_scoring(new_user.consumer_number, response)
+    return new_user
+
+@async_router.get("/users/by-email/{email}", response_model=schemas.UserResponse)
+async def get_user_by_email_async(email: str, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    user = result.scalars().first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+@async_router.post("/appliances/", response_model=list[schemas.ApplianceResponse])
+async def create_appliances_async(appliance_list: schemas.ApplianceList, response: Response, db: AsyncSession = Depends(get_async_db), user: models.User = Depends(get_current_user_async)):
+    appliances = unique_appliances(user.consumer_number, appliance_list)
+    if not appliances:
+        return []
+    changed = (await db.execute(upsert_appliances(appliances))).all()
+    await db.commit()
+    if changed and await should_train_async(user, db):
+        enqueue_scoring(user.consumer_number, response)
+    return appliances
+
+@async_router.get("/appliances/", response_model=list[schemas.ApplianceResponse])
+async def get_appliances_async(request: Request, response: Response, page: Page = Depends(), db: AsyncSession = Depends(get_async_db), user: models.User = Depends(get_current_user_async)):
+    stamp = (await db.execute(version_query(user.consumer_number, "appliances"))).first()
+    cached = not_modified(request, response, user.consumer_number, "appliances", stamp)
+    if cached:
+        return cached
+    stmt = select(*columns_for(models.Appliance, schemas.ApplianceResponse)).where(models.Appliance.consumer_number == user.consumer_number)
+    stmt = page.apply(stmt, models.Appliance.appliance_name)
+    if page.stream:
+        return stream_ndjson_async(stmt, response)
+    appliances = page.finish((await db.execute(stmt)).all(), lambda a: a.appliance_name, response)
+    if not appliances and page.after is None:
+        raise HTTPException(status_code=404, detail="No appliances found for this user")
+    return list_response(appliances, response)
+
+@async_router.post("/bills/", response_model=dict)
+async def create_bill_async(bill: schemas.BillCreate, response: Response, db: AsyncSession = Depends(get_async_db), user: models.User = Depends(get_current_user_async)):
+    new_bill = models.Bill(
+        consumer_number=user.consumer_number,
+        month=bill.month,
+        units_consumed=bill.units_consumed,
+        cost_per_unit=bill.cost_per_unit,
     )
+    db.add(new_bill)
+    await db.commit()
 
-    if not record:
-        raise HTTPException(status_code=404, detail="No data found for the given month and consumer number")
+    job = None
+    predicted_values = None
+    if await should_train_async(user, db):
+        try:
+            rows = await run_in_threadpool(score_consumer_now, user.consumer_number, [bill.month])
+            predicted_values = rows[0] if rows else None
+        except FileNotFoundError:
+            job = enqueue_scoring(user.consumer_number, response)
 
     return {
-        "current_bill": record.bill_amount,
-        "shifted_bill": record.reduced_bill_amount,
-        "current_carbon": record.carbon_footprint,
-        "shifted_carbon": record.reduced_carbon_footprint
+        "bill": schemas.BillResponse.model_validate(new_bill),
+        "prediction": prediction_summary(predicted_values),
+        "job_id": job.id if job else None,
     }
+
+@async_router.get("/bills/", response_model=list[schemas.BillResponse])
+async def get_bills_async(request: Request, response: Response, from_month: Optional[schemas.Month] = None, to_month: Optional[schemas.Month] = None, page: Page = Depends(), db: AsyncSession = Depends(get_async_db), user: models.User = Depends(get_current_user_async)):
+    stamp = (await db.execute(version_query(user.consumer_number, "bills"))).first()
+    cached = not_modified(request, response, user.consumer_number, "bills", stamp)
+    if cached:
+        return cached
+    stmt = select(*columns_for(models.Bill, schemas.BillResponse)).where(models.Bill.consumer_number == user.consumer_number)
+    stmt = page.apply(in_month_range(stmt, models.Bill.month, from_month, to_month), models.Bill.month, schemas.parse_month)
+    if page.stream:
+        return stream_ndjson_async(stmt, response)
+    bills = page.finish((await db.execute(stmt)).all(), lambda b: b.month, response)
+    if not bills and page.after is None:
+        raise HTTPException(status_code=404, detail="No bills found for this user")
+    return list_response(bills, response)
+
+@async_router.get("/predictions/", response_model=list[schemas.PredictionResponse])
+async def get_predictions_async(request: Request, response: Response, from_month: Optional[schemas.Month] = None, to_month: Optional[schemas.Month] = None, page: Page = Depends(), db: AsyncSession = Depends(get_async_db), user: models.User = Depends(get_current_user_async)):
+    stamp = (await db.execute(version_query(user.consumer_number, "predictions"))).first()
+    cached = not_modified(request, response, user.consumer_number, "predictions", stamp)
+    if cached:
+        return cached
+    stmt = select(*columns_for(models.Prediction, schemas.PredictionResponse)).where(models.Prediction.consumer_number == user.consumer_number)
+    stmt = page.apply(in_month_range(stmt, models.Prediction.month, from_month, to_month), models.Prediction.month, schemas.parse_month)
+    if page.stream:
+        return stream_ndjson_async(stmt, response)
+    predictions = page.finish((await db.execute(stmt)).all(), lambda p: p.month, response)
+    if not predictions and page.after is None:
+        raise HTTPException(status_code=404, detail="No prediction data found for this user")
+    return list_response(predictions, response)
+
+@async_router.get("/dashboard", response_model=schemas.DashboardResponse)
+async def get_dashboard_async(months: int = Query(12, ge=1, le=120), db: AsyncSession = Depends(get_async_db), user: models.User = Depends(get_current_user_async)):
+    row = (await db.execute(DASHBOARD_QUERY, {"consumer_number": user.consumer_number, "months": months})).one()
+    return dashboard_payload(user, row)
+
+app.include_router(async_router)
+
+# -----------------------------------------------
+# ⏳ JOB STATUS ROUTES
+# -----------------------------------------------
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str, user: models.User = Depends(get_current_user)):
+    job = job_queue.get(job_id)
+    if not job or job.key != user.consumer_number:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_queue.cancel(job_id).to_dict()
+
+# -----------------------------------------------
+# 🧠 MODEL STATUS
+# -----------------------------------------------
+
+@app.get("/model/")
+def get_model_status():
+    return model_server.status()
+
+# -----------------------------------------------
+# 📈 METRICS
+# -----------------------------------------------
+
+@app.get("/metrics/")
+def get_metrics():
+    return {
+        "auth_token_cache": token_cache.stats(),
+        "auth_user_cache": user_cache.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "db_pools": pool_stats(),
+    }
\ No newline at end of file
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from app.artifact import MANIFEST, best_rounds, is_current, load_native
+from app.encoder import FeatureEncoder
+
+# -----------------------------------------------
+# 🧠 RESIDENT MODEL SERVER
+# -----------------------------------------------
+# The stacked model is loaded once per API process and kept in memory. It
+# comes from the native artifact (app/artifact.py: native boosters plus
+# memory-mapped forest arrays shared by all workers) when it is current, and
+# from the pickle otherwise (no artifact, or a pickle written after it). A watcher thread polls the artifact and swaps in
+# a new model when training replaces it (training writes via os.replace, so
+# a changed inode/mtime always means a complete file).
+
+MODEL_PATH = "stacked_energy_model.pkl"
+ENCODER_PATH = os.path.splitext(MODEL_PATH)[0] + ".encoder.json"
+NATIVE_PATH = os.path.splitext(MODEL_PATH)[0] + ".native"
+
+
+def load_encoder(model, path=ENCODER_PATH):
+    """The encoder saved with `model`, or one derived from the model if none matches."""
+    try:
+        encoder = FeatureEncoder.load(path)
+    except FileNotFoundError:
+        return FeatureEncoder.from_model(model)
+    if encoder.features != list(model.feature_names_in_):
+        return FeatureEncoder.from_model(model)
+    return encoder
+
+
+def fast_predict(model, X):
+    """Predict on a float32 matrix laid out in `model.feature_names_in_` order.
+
+    For the XGBoost + RandomForest stack this skips sklearn's per-call input
+    validation and DataFrame handling: the boosters use in-place prediction
+    (up to their best round, like XGBRegressor.predict) and the forest
+    averages its trees directly. Any other model falls back to
+    its own `predict`.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    estimators = getattr(model, "estimators_", None)
+    final = getattr(model, "final_estimator_", None)
+    if estimators is None or final is None or getattr(model, "passthrough", False):
+        return model.predict(X)
+
+    base = np.column_stack([_predict_estimator(est, X) for est in estimators])
+    return _predict_estimator(final, np.ascontiguousarray(base, dtype=np.float32))
+
+
+def _predict_estimator(est, X):
+    if hasattr(est, "get_booster"):
+        booster = est.get_booster()
+        return booster.inplace_predict(X, iteration_range=best_rounds(booster))
+    trees = getattr(est, "estimators_", None)
+    if trees is not None and all(hasattr(tree, "tree_") for tree in trees):
+        return np.mean([tree.predict(X, check_input=False) for tree in trees], axis=0)
+    return est.predict(X)
+
+
+class ModelServer:
+    def __init__(self, path=MODEL_PATH, encoder_path=ENCODER_PATH, native_path=NATIVE_PATH, poll_interval=5.0):
+        self.path = path
+        self.encoder_path = encoder_path
+        self.native_path = native_path
+        self.poll_interval = poll_interval
+        self._state = None  # (model, encoder, stamp, loaded_at)
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def _source(self):
+        """The native manifest when it is current, else the pickle."""
+        if self.native_path and is_current(self.native_path, self.path):
+            return os.path.join(self.native_path, MANIFEST)
+        return self.path
+
+    def _stamp(self):
+        source = self._source()
+        st = os.stat(source)
+        return (source, st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def load_if_changed(self):
+        """Reload the artifact if it changed on disk. Returns True when a new model was swapped in."""
+        with self._load_lock:
+            stamp = self._stamp()
+            if self._state is not None and self._state[2] == stamp:
+                return False
+            native = stamp[0] != self.path
+            model = load_native(self.native_path) if native else joblib.load(self.path)
+            # Training writes the encoder before replacing the model, so it is already current here
+            encoder = load_encoder(model, self.encoder_path)
+            # Single reference assignment: readers see either the old or the new model, never a mix
+            self._state = (model, encoder, stamp, time.time())
+            print(f"Loaded model from {self.native_path if native else self.path}")
+            return True
+
+    def _state_or_load(self):
+        state = self._state
+        if state is None:
+            self.load_if_changed()
+            state = self._state
+        return state
+
+    def snapshot(self):
+        """`(model, encoder)` from the same load, safe to use across a hot reload."""
+        return self._state_or_load()[:2]
+
+    def status(self):
+        state = self._state
+        if state is None:
+            return {"loaded": False, "path": self.path}
+        source = state[2][0]
+        return {"loaded": True, "path": self.path if source == self.path else self.native_path,
+                "format": "pickle" if source == self.path else "native",
+                "loaded_at": state[3], "n_features": len(state[1].features)}
+
+    # ---------- hot reload ----------
+
+    def start(self):
+        if self._watcher is not None:
+            return
+        try:
+            self.load_if_changed()
+        except FileNotFoundError:
+            print(f"No model at {self.path} yet; waiting for training to produce one")
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.load_if_changed()
+            except FileNotFoundError:
+                pass
+            except Exception as exc:
+                # Keep serving the previous model if the new artifact can't be loaded
+                print(f"Model reload failed: {exc!r}")
+
+
+model_server = ModelServer()
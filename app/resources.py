@@ -0,0 +1,124 @@
+import os
+import time
+
+import numpy as np
+import xgboost as xgb
+from sklearn.ensemble._forest import BaseForest
+from threadpoolctl import threadpool_limits
+
+# -----------------------------------------------
+# 🪫 TRAINING RESOURCE GOVERNOR
+# -----------------------------------------------
+# XGBoost, scikit-learn and BLAS each default to every core. When training
+# shares the box with the API that starves the uvicorn workers, so training
+# and batch scoring run under a profile: an explicit thread count handed to
+# the models as n_jobs, the same cap applied to BLAS/OpenMP pools (and to the
+# environment inherited by child processes), and for "background" a lower
+# scheduling priority pinned to a small share of the cores. A Deadline caps
+# wall-clock time: the remaining time is shared out over the fits still to
+# run, and a fit that uses up its share stops boosting (forests at the
+# current size), which still leaves a complete model. Under a budget a booster
+# scores each round on a few held-out rows and keeps its best round rather
+# than whichever one the clock stopped it at.
+
+PROFILES = {
+    "foreground": {"cpu_share": 1.0, "nice": 0},
+    "background": {"cpu_share": 0.25, "nice": 10},
+}
+DEFAULT_PROFILE = os.getenv("TRAINING_PROFILE", "foreground")
+
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                   "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"]
+FOREST_STEP = 10  # trees grown between deadline checks
+EVAL_FRACTION = 0.1  # rows a budgeted booster holds out to pick its best round
+EARLY_STOPPING_ROUNDS = 20
+
+
+def _available_cpus():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        return list(range(os.cpu_count() or 1))
+
+
+def apply_profile(name=DEFAULT_PROFILE, threads=None):
+    """Cap this process (and its children) to the profile; returns the thread count to give models."""
+    profile = PROFILES[name]
+    cpus = _available_cpus()
+    threads = threads or max(1, int(len(cpus) * profile["cpu_share"]))
+
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    threadpool_limits(limits=threads)  # pools of libraries already imported
+
+    if profile["nice"]:
+        os.nice(profile["nice"])
+        if hasattr(os, "sched_setaffinity") and threads < len(cpus):
+            # Leave the lowest-numbered cores, where the API workers usually land, alone
+            os.sched_setaffinity(0, cpus[-threads:])
+    return threads
+
+
+class Deadline:
+    def __init__(self, seconds=None, parent=None):
+        self.at = time.monotonic() + seconds if seconds is not None else None
+        self.parent = parent
+        self.hits = 0  # fits cut short under this deadline
+        self.parts = 1
+
+    @property
+    def hit(self):
+        return self.hits > 0
+
+    def expired(self):
+        if self.at is None or time.monotonic() < self.at:
+            return False
+        deadline = self
+        while deadline is not None:
+            deadline.hits += 1
+            deadline = deadline.parent
+        return True
+
+    def plan(self, parts):
+        """Announce how many fits the remaining time has to cover."""
+        self.parts = max(1, parts)
+
+    def next_share(self):
+        """Deadline for the next planned fit: an equal share of what is left (unused time rolls over)."""
+        if self.at is None:
+            return self
+        share = Deadline(max(0.0, self.at - time.monotonic()) / self.parts, parent=self)
+        self.parts = max(1, self.parts - 1)
+        return share
+
+
+class _StopAtDeadline(xgb.callback.TrainingCallback):
+    def __init__(self, deadline):
+        super().__init__()
+        self.deadline = deadline
+
+    def after_iteration(self, model, epoch, evals_log):
+        return self.deadline.expired()
+
+
+def fit_within(estimator, X, y, deadline=None):
+    """`estimator.fit(X, y)`, cut short (but still usable) once `deadline` passes."""
+    if deadline is None or deadline.at is None:
+        return estimator.fit(X, y)
+    if isinstance(estimator, xgb.XGBModel):
+        held = np.random.default_rng(0).random(len(y)) < EVAL_FRACTION
+        # save_best trims the booster to its best round, so every predict path (and the saved file) uses it
+        estimator.set_params(callbacks=[xgb.callback.EarlyStopping(rounds=EARLY_STOPPING_ROUNDS, save_best=True),
+                                        _StopAtDeadline(deadline)])
+        estimator.fit(X[~held], y[~held], eval_set=[(X[held], y[held])], verbose=False)
+        return estimator.set_params(callbacks=None)
+    if isinstance(estimator, BaseForest):
+        target = estimator.n_estimators
+        estimator.set_params(warm_start=True, n_estimators=0)
+        while estimator.n_estimators < target:
+            estimator.set_params(n_estimators=min(target, estimator.n_estimators + FOREST_STEP))
+            estimator.fit(X, y)
+            if deadline.expired():
+                break
+        return estimator.set_params(warm_start=False)
+    return estimator.fit(X, y)
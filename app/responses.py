@@ -0,0 +1,49 @@
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib encoder
+    orjson = None
+
+# -----------------------------------------------
+# 🚀 FAST JSON RESPONSES
+# -----------------------------------------------
+# Hot list reads select plain column tuples and hand them straight to the
+# encoder: no ORM instances, no per-row Pydantic models. orjson writes dates,
+# floats and ints natively; without it the stdlib encoder is used with
+# dates rendered the same way (ISO 8601).
+
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def columns_for(model, schema):
+    """The model columns a response schema exposes, in schema field order."""
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+def rows_to_dicts(rows):
+    if not rows:
+        return []
+    keys = list(rows[0]._fields)
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def ndjson_line(row):
+    return dumps(row._asdict()) + b"\n"
@@ -1,5 +1,31 @@
-from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+from typing import Annotated, List, Optional
+import datetime
+import re
+
+MONTH_NAMES = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+
+def parse_month(value) -> datetime.date:
+    """Normalise a month to its first day; accepts dates and the strings clients have sent
+    ("2025-03", "2025-03-17", "03/2025", "March 2025", "Mar 2025", or "March" for this year)."""
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.replace(day=1)
+    text = str(value).strip()
+    match = re.fullmatch(r"(\d{4})-(\d{1,2})(?:-\d{1,2})?|(\d{1,2})/(\d{4})", text)
+    if match:
+        year, month = (match[1], match[2]) if match[1] else (match[4], match[3])
+    else:
+        match = re.fullmatch(r"([A-Za-z]+)(?:\s+(\d{4}))?", text)
+        name = match[1].lower()[:3] if match else None
+        if name not in MONTH_NAMES:
+            raise ValueError(f"Unrecognised month: {value!r}")
+        year, month = match[2] or datetime.date.today().year, MONTH_NAMES.index(name) + 1
+    return datetime.date(int(year), int(month), 1)
+
+# 🔹 Stored as a DATE (first of month); accepts the free-form strings the app used to send
+Month = Annotated[datetime.date, BeforeValidator(parse_month)]
 
 class UserCreate(BaseModel):
     name: str
@@ -13,6 +39,11 @@ class UserCreate(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+MAX_BATCH_USERS = 100  # one batch holds the bcrypt pool for users / workers hashes
+
+class UserBatch(BaseModel):
+    users: List[UserCreate] = Field(min_length=1, max_length=MAX_BATCH_USERS)
+
 class UserResponse(BaseModel):
     name: str
     email: str
@@ -56,15 +87,20 @@ class ApplianceList(BaseModel):
 
 class BillCreate(BaseModel):
     consumer_number: int  # 🔹 Changed to int
-    month: str
+    month: Month
     units_consumed: float
     cost_per_unit: float 
 
     model_config = ConfigDict(from_attributes=True)
 
+MAX_BATCH_BILLS = 1000  # rows in one multi-row upsert
+
+class BillBatch(BaseModel):
+    bills: List[BillCreate] = Field(max_length=MAX_BATCH_BILLS)
+
 class BillResponse(BaseModel):
     consumer_number: int  # 🔹 Changed to int
-    month: str
+    month: Month
     units_consumed: float
     cost_per_unit: float
 
@@ -72,7 +108,7 @@ class BillResponse(BaseModel):
 
 class PredictionResponse(BaseModel):
     consumer_number: int
-    month: str
+    month: Month
     energy_consumption: float
     reduced_consumption: float
     bill_amount: float
@@ -80,4 +116,10 @@ class PredictionResponse(BaseModel):
     carbon_footprint: float
     reduced_carbon_footprint: float
     
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class DashboardResponse(BaseModel):
+    profile: UserResponse
+    latest_bill: Optional[BillResponse] = None
+    appliances: List[ApplianceResponse]
+    predictions: List[PredictionResponse]  # newest first
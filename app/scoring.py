@@ -0,0 +1,293 @@
+import io
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import insert
+
+from app import models
+from app.cache import TTLCache
+from app.encoder import FeatureEncoder
+from app.model_server import fast_predict, model_server
+
+# -----------------------------------------------
+# 🔮 SCORING PIPELINE
+# -----------------------------------------------
+# Shared by scripts/train11.py (batch, every consumer) and the API (one
+# consumer, only the months that changed). Both read one pre-aggregated row
+# per (consumer, month) from the feature views defined in the 3c9e4b7a1f20
+# migration and go through the same post-processing below. The API's
+# handful of rows stay plain mappings end to end (see score_records); only
+# the batch path builds DataFrames.
+
+CARBON_FACTOR = 0.82  # kg CO2 per kWh
+EXTRA_COLUMNS = ['total_usage_hours', 'working_members', 'family_members', 'cost_per_unit']
+PREDICTION_COLUMNS = ['consumer_number', 'month', 'energy_consumption', 'reduced_consumption',
+                      'bill_amount', 'reduced_bill_amount', 'carbon_footprint', 'reduced_carbon_footprint']
+
+# Batch scoring reads the materialized view (refreshed once per run); the API
+# reads the plain view so a bill committed a moment ago is already visible.
+FEATURE_VIEW = "consumer_features"
+LIVE_FEATURE_VIEW = "consumer_features_live"
+
+# API-side read cache of predictions keyed by (consumer_number, month), each
+# entry tagged with the resource_versions stamp it was read at. get_value
+# checks that stamp on every hit, which covers writes from other API workers
+# and the batch script; this process's own scoring writes also drop the keys
+# they write, before the upsert and again after the commit (see
+# invalidate_predictions).
+prediction_cache = TTLCache(maxsize=50000, ttl=300.0)
+
+# Smaller writes send one multi-row INSERT ... ON CONFLICT per chunk (a single
+# round trip, and one statement-level trigger firing, per chunk on any driver)
+VALUES_CHUNK_ROWS = 1000  # 8 bind parameters per row, well under Postgres' 65535
+
+# Staged rows are merged into predictions with one set-based statement
+STAGING_TABLE = "predictions_staging"
+COPY_MIN_ROWS = 500  # below this a temp table + COPY costs more than multi-row VALUES
+
+_columns = ", ".join(PREDICTION_COLUMNS)
+_updates = ",\n        ".join(f"{c} = EXCLUDED.{c}" for c in PREDICTION_COLUMNS[2:])
+CREATE_STAGING = f"""
+    DROP TABLE IF EXISTS {STAGING_TABLE};
+    CREATE TEMP TABLE {STAGING_TABLE} (LIKE predictions INCLUDING DEFAULTS) ON COMMIT DROP;
+"""
+COPY_STAGING = f"COPY {STAGING_TABLE} ({_columns}) FROM STDIN WITH (FORMAT csv)"
+MERGE_STAGING = f"""
+    INSERT INTO predictions ({_columns})
+    SELECT DISTINCT ON (consumer_number, month) {_columns} FROM {STAGING_TABLE}
+    ON CONFLICT (consumer_number, month)
+    DO UPDATE SET
+        {_updates};
+"""
+
+
+def refresh_feature_view(conn):
+    conn.exec_driver_sql(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {FEATURE_VIEW}")
+
+
+def _feature_query(consumer_number=None, months=None, source=FEATURE_VIEW, consumers=None):
+    query = f"SELECT * FROM {source}"
+    params = {}
+    conditions = []
+    expanding = []
+    if consumer_number is not None:
+        conditions.append("consumer_number = :consumer_number")
+        params["consumer_number"] = consumer_number
+    if consumers:
+        conditions.append("consumer_number IN :consumers")
+        params["consumers"] = list(consumers)
+        expanding.append(bindparam("consumers", expanding=True))
+    if months:
+        conditions.append("month IN :months")
+        params["months"] = list(months)
+        expanding.append(bindparam("months", expanding=True))
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    stmt = text(query)
+    if expanding:
+        stmt = stmt.bindparams(*expanding)
+    return stmt, params
+
+
+def fetch_feature_matrix(conn, consumer_number=None, months=None, source=FEATURE_VIEW, consumers=None):
+    """One ready-to-score row per (consumer, month), optionally narrowed to some consumers and months."""
+    stmt, params = _feature_query(consumer_number, months, source, consumers)
+    return pd.read_sql_query(stmt, conn, params=params)
+
+
+def fetch_feature_rows(conn, consumer_number=None, months=None, source=FEATURE_VIEW, consumers=None):
+    """`fetch_feature_matrix` as a list of row mappings, for the few rows the API scores."""
+    stmt, params = _feature_query(consumer_number, months, source, consumers)
+    return conn.execute(stmt, params).mappings().all()
+
+
+def predict(df, model, encoder=None):
+    """Score a feature frame and derive bill, carbon and reduced-usage figures."""
+    encoder = encoder or FeatureEncoder.from_model(model)
+
+    # The encoder builds the model input; only the columns needed for post-processing are kept
+    df_final = df[['consumer_number', 'month'] + EXTRA_COLUMNS].copy()
+    df_final["energy_consumption"] = fast_predict(model, encoder.transform(df))
+
+    # Compute additional outputs
+    df_final["carbon_footprint"] = df_final["energy_consumption"] * CARBON_FACTOR
+    df_final["bill_amount"] = df_final["energy_consumption"] * df_final["cost_per_unit"]
+
+    # Effective usage hours calculation with error handling
+    df_final["effective_usage_hours"] = df_final["total_usage_hours"] * (
+        1 - ((df_final["working_members"] * 8 / 24) / (df_final["family_members"] * 24)).fillna(0)
+    )
+    df_final["effective_usage_hours"] = df_final["effective_usage_hours"].clip(lower=0)
+
+    df_final["reduced_consumption"] = df_final["energy_consumption"] * (
+        df_final["effective_usage_hours"] / df_final["total_usage_hours"].replace(0, 1)
+    )
+    df_final["reduced_bill_amount"] = df_final["reduced_consumption"] * df_final["cost_per_unit"]
+    df_final["reduced_carbon_footprint"] = df_final["reduced_consumption"] * CARBON_FACTOR
+    return df_final
+
+
+def _column(rows, name):
+    return np.array([np.nan if row[name] is None else float(row[name]) for row in rows], dtype=np.float64)
+
+
+def score_records(rows, model, encoder=None):
+    """`predict` for a few feature mappings: the same figures as prediction dicts, without a DataFrame."""
+    encoder = encoder or FeatureEncoder.from_model(model)
+    energy = fast_predict(model, encoder.transform_records(rows))  # float32, as in `predict`
+    total, working, family, cost = (_column(rows, name) for name in EXTRA_COLUMNS)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = (working * 8 / 24) / (family * 24)
+        effective = np.maximum(total * (1 - np.where(np.isnan(share), 0, share)), 0)
+        effective[np.isnan(total)] = np.nan  # clip(lower=0) keeps missing values missing
+        reduced = energy * (effective / np.where(total == 0, 1, total))
+
+    figures = {
+        "energy_consumption": energy,
+        "reduced_consumption": reduced,
+        "bill_amount": energy * cost,
+        "reduced_bill_amount": reduced * cost,
+        "carbon_footprint": energy * CARBON_FACTOR,
+        "reduced_carbon_footprint": reduced * CARBON_FACTOR,
+    }
+    return [
+        {"consumer_number": row["consumer_number"], "month": row["month"],
+         **{name: float(values[i]) for name, values in figures.items()}}
+        for i, row in enumerate(rows)
+    ]
+
+
+def _prediction_keys(predictions):
+    if isinstance(predictions, pd.DataFrame):
+        return zip(predictions["consumer_number"], predictions["month"])
+    return ((row["consumer_number"], row["month"]) for row in predictions)
+
+
+def upsert_predictions(conn, predictions, method="auto"):
+    """Write predictions (a frame from `predict` or dicts from `score_records`) in the caller's transaction.
+
+    Returns throughput stats.
+
+    `copy` streams the frame into a temp staging table and merges it with one
+    INSERT ... SELECT ... ON CONFLICT; `values` sends multi-row
+    INSERT ... VALUES ... ON CONFLICT statements of up to VALUES_CHUNK_ROWS
+    rows. `auto` uses COPY for large frames when the driver supports it
+    (psycopg2's copy_expert).
+    """
+    started = time.perf_counter()
+    n_rows = len(predictions)
+    invalidate_predictions(predictions)  # and again once the caller commits
+    if method == "auto":
+        use_copy = n_rows >= COPY_MIN_ROWS and conn.dialect.driver == "psycopg2"
+        method = "copy" if use_copy else "values"
+
+    if not n_rows:
+        pass
+    elif method == "copy":
+        frame = (predictions[PREDICTION_COLUMNS] if isinstance(predictions, pd.DataFrame)
+                 else pd.DataFrame(predictions, columns=PREDICTION_COLUMNS))
+        buf = io.StringIO()
+        frame.to_csv(buf, index=False, header=False)
+        buf.seek(0)
+        conn.exec_driver_sql(CREATE_STAGING)
+        with conn.connection.dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(COPY_STAGING, buf)
+        conn.exec_driver_sql(MERGE_STAGING)
+    elif method == "values":
+        records = (predictions[PREDICTION_COLUMNS].to_dict(orient="records")
+                   if isinstance(predictions, pd.DataFrame) else predictions)
+        # One statement can't update a row twice: the last prediction per key wins
+        records = list({(row["consumer_number"], row["month"]): row for row in records}.values())
+        for start in range(0, len(records), VALUES_CHUNK_ROWS):
+            stmt = insert(models.Prediction).values(records[start:start + VALUES_CHUNK_ROWS])
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=[models.Prediction.consumer_number, models.Prediction.month],
+                set_={c: stmt.excluded[c] for c in PREDICTION_COLUMNS[2:]},
+            ))
+    else:
+        raise ValueError(f"Unknown upsert method: {method}")
+
+    elapsed = time.perf_counter() - started
+    return {
+        "method": method,
+        "rows": n_rows,
+        "seconds": elapsed,
+        "rows_per_second": n_rows / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def invalidate_predictions(predictions):
+    """Drop the cached get_value entries for the predictions' (consumer, month) pairs.
+
+    Called before the write and again after the commit: a reader that loads
+    the old committed row in between either sees the generation change and
+    skips caching it, or has its entry removed by the second call.
+    """
+    if len(predictions) >= prediction_cache.maxsize:
+        prediction_cache.clear()
+        return
+    for consumer_number, month in _prediction_keys(predictions):
+        prediction_cache.pop((consumer_number, month))
+
+
+def score_all(engine, model, encoder=None):
+    """Batch path: score every consumer and write all predictions in one transaction."""
+    with engine.connect() as conn:
+        refresh_feature_view(conn)
+        conn.commit()
+        df_final = predict(fetch_feature_matrix(conn), model, encoder)
+        stats = upsert_predictions(conn, df_final)
+        conn.commit()
+        invalidate_predictions(df_final)
+    return df_final, stats
+
+
+def score_consumer(db, consumer_number, months=None, model=None, encoder=None, check=None):
+    """Score one consumer in-process, upsert its predictions and return them as dicts.
+
+    Only the given months are rescored when `months` is passed; otherwise every
+    month the consumer has a bill for. `check` (a job's checkpoint) runs
+    between the stages, so a cancelled or timed-out job stops before writing.
+    """
+    check = check or (lambda: None)
+    conn = db.connection()
+    rows = fetch_feature_rows(conn, consumer_number=consumer_number, months=months, source=LIVE_FEATURE_VIEW)
+    if not rows:
+        return []
+    check()
+    if model is None:
+        model, encoder = model_server.snapshot()
+    predictions = score_records(rows, model, encoder)
+    check()
+    upsert_predictions(conn, predictions)
+    db.commit()
+    invalidate_predictions(predictions)
+    return predictions
+
+
+def score_bills(db, keys, model=None, encoder=None):
+    """Score many (consumer_number, month) pairs in one read, one predict and one upsert.
+
+    Used by bulk bill ingestion: the affected consumers and months are fetched
+    together from the live view, narrowed to the exact pairs, and written back
+    in a single transaction.
+    """
+    keys = set(keys)
+    if not keys:
+        return []
+    conn = db.connection()
+    rows = fetch_feature_rows(conn, consumers={c for c, _ in keys}, months={m for _, m in keys},
+                              source=LIVE_FEATURE_VIEW)
+    rows = [row for row in rows if (row["consumer_number"], row["month"]) in keys]
+    if not rows:
+        return []
+    if model is None:
+        model, encoder = model_server.snapshot()
+    predictions = score_records(rows, model, encoder)
+    upsert_predictions(conn, predictions)
+    db.commit()
+    invalidate_predictions(predictions)
+    return predictions
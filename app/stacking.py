@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import StackingRegressor
+from sklearn.model_selection import KFold
+from sklearn.utils import Bunch
+
+from app.resources import fit_within
+
+# -----------------------------------------------
+# 🧱 STACKING WITH CACHED OUT-OF-FOLD PREDICTIONS
+# -----------------------------------------------
+# Fits the same model StackingRegressor.fit would (5-fold KFold out-of-fold
+# predictions feed the meta-learner; base models refit on all rows), but
+# keeps every intermediate on disk:
+#
+#   folds.npy          fold id of every training row
+#   y.npy              training target
+#   <name>.oof.npy     out-of-fold predictions of base model <name>
+#   <name>.joblib      base model <name> fitted on all training rows
+#   manifest.json      which data split and which params produced each file
+#
+# A base model whose params are unchanged is reused from the cache, so
+# changing the meta-learner costs one small fit and changing one base model
+# refits only that one.
+
+N_SPLITS = 5  # StackingRegressor's default cv
+RUNTIME_PARAMS = {"n_jobs", "nthread", "callbacks", "verbose", "warm_start"}  # don't change the fitted model
+
+
+def params_key(estimator):
+    """Stable hash of an estimator's class and the constructor params that shape the fit."""
+    params = {k: v for k, v in estimator.get_params(deep=False).items() if k not in RUNTIME_PARAMS}
+    spec = {"class": type(estimator).__name__, "params": params}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def fold_assignments(n_rows, n_splits=N_SPLITS):
+    folds = np.empty(n_rows, dtype=np.int8)
+    for k, (_, test_idx) in enumerate(KFold(n_splits=n_splits).split(np.empty((n_rows, 1)))):
+        folds[test_idx] = k
+    return folds
+
+
+def _share(deadline):
+    return deadline.next_share() if deadline is not None else None
+
+
+def out_of_fold_predict(estimator, X, y, folds, deadline=None):
+    """cross_val_predict with explicit fold ids: each row is predicted by the model that did not see it."""
+    oof = np.empty(len(y), dtype=np.float64)
+    for k in np.unique(folds):
+        test = folds == k
+        fold_model = fit_within(clone(estimator), X[~test], y[~test], _share(deadline))
+        oof[test] = fold_model.predict(X[test])
+    return oof
+
+
+class OOFCache:
+    def __init__(self, path):
+        self.path = path
+        self.manifest = self._read_manifest()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_manifest(self):
+        try:
+            with open(self._file("manifest.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"data": None, "bases": {}}
+
+    def _write_manifest(self):
+        tmp = self._file("manifest.json.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self._file("manifest.json"))
+
+    def _save(self, name, writer):
+        tmp = self._file(name + ".tmp")
+        writer(tmp)
+        os.replace(tmp, self._file(name))
+
+    def _save_array(self, name, array):
+        def write(path):
+            with open(path, 'wb') as f:
+                np.save(f, array)
+        self._save(name, write)
+
+    def bind(self, data_key, y, n_splits=N_SPLITS):
+        """Attach the cache to a training split; a different split invalidates every base model."""
+        os.makedirs(self.path, exist_ok=True)
+        if self.manifest.get("data") != data_key or self.manifest.get("n_splits") != n_splits:
+            self.manifest = {"data": data_key, "n_splits": n_splits, "bases": {}}
+            folds = fold_assignments(len(y), n_splits)
+            self._save_array("folds.npy", folds)
+            self._save_array("y.npy", np.asarray(y, dtype=np.float64))
+            self._write_manifest()
+        return self.folds()
+
+    def folds(self):
+        return np.load(self._file("folds.npy"))
+
+    def has_base(self, name, key):
+        return self.manifest["bases"].get(name) == key
+
+    def load_base(self, name):
+        return np.load(self._file(f"{name}.oof.npy")), joblib.load(self._file(f"{name}.joblib"))
+
+    def store_base(self, name, key, oof, fitted, complete=True):
+        self._save_array(f"{name}.oof.npy", oof)
+        self._save(f"{name}.joblib", lambda p: joblib.dump(fitted, p))
+        # A fit cut short by a time budget is usable now but must not be reused later
+        self.manifest["bases"][name] = key if complete else None
+        self._write_manifest()
+
+
+def fit_base(cache, name, estimator, X, y, folds, force=False, deadline=None):
+    """Out-of-fold predictions and full fit for one base model, from cache when its params are unchanged."""
+    key = params_key(estimator)
+    if not force and cache.has_base(name, key):
+        return cache.load_base(name)
+    hits = deadline.hits if deadline is not None else 0
+    oof = out_of_fold_predict(estimator, X, y, folds, deadline)
+    fitted = fit_within(clone(estimator), X, y, _share(deadline))
+    cache.store_base(name, key, oof, fitted, complete=deadline is None or deadline.hits == hits)
+    return oof, fitted
+
+
+def assemble_stack(estimators, fitted, final_estimator):
+    """A fitted StackingRegressor built from already-fitted parts; predicts exactly like one from .fit()."""
+    stack = StackingRegressor(estimators=list(estimators.items()), final_estimator=final_estimator)
+    stack.estimators_ = [fitted[name] for name in estimators]
+    stack.named_estimators_ = Bunch(**{name: fitted[name] for name in estimators})
+    stack.stack_method_ = ["predict"] * len(estimators)
+    stack.final_estimator_ = final_estimator
+    for est in stack.estimators_:
+        if hasattr(est, "feature_names_in_"):
+            stack.feature_names_in_ = est.feature_names_in_
+    return stack
+
+
+def fit_stack(estimators, final_estimator, X, y, cache_path, data_key, refit=(), deadline=None):
+    """Fit the stack through the OOF cache. `refit` names base models to refit even if cached.
+
+    With a `deadline`, the time left is shared across the fits still to run
+    and each one stops early when its share runs out, so the stack is always
+    complete.
+    """
+    cache = OOFCache(cache_path)
+    folds = cache.bind(data_key, y)
+    if deadline is not None:
+        pending = [name for name, est in estimators.items()
+                   if name in refit or not cache.has_base(name, params_key(est))]
+        deadline.plan(len(pending) * (len(np.unique(folds)) + 1) + 1)
+    fitted, columns = {}, []
+    for name, estimator in estimators.items():
+        oof, fitted[name] = fit_base(cache, name, estimator, X, y, folds, force=name in refit, deadline=deadline)
+        columns.append(oof)
+    final = fit_within(clone(final_estimator), np.column_stack(columns), y, _share(deadline))
+    return assemble_stack(estimators, fitted, final)
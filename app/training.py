@@ -0,0 +1,311 @@
+import copy
+import hashlib
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+import xgboost as xgb
+from sklearn.ensemble import RandomForestRegressor, StackingRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+
+from app import artifact
+from app.encoder import FeatureEncoder
+from app.model_server import ENCODER_PATH, MODEL_PATH, load_encoder
+from app.stacking import fit_stack
+
+# -----------------------------------------------
+# 🤖 TRAINING PIPELINE
+# -----------------------------------------------
+# The stacked model is content-addressed: the dataset bytes, feature list and
+# hyperparameters are hashed, and a saved model with the same fingerprint is
+# loaded instead of being refit. When a refit is needed, base models whose
+# params did not change come from the out-of-fold cache (see app/stacking.py).
+
+DATA_PATH = "data/energy_dataa.csv"
+META_PATH = os.path.splitext(MODEL_PATH)[0] + ".meta.json"
+OOF_PATH = os.path.splitext(MODEL_PATH)[0] + ".oof"
+
+TARGET = 'energy_consumption'
+DROP_COLUMNS = ['ages']
+TEST_SIZE = 0.2
+HOLDOUT_BUCKETS = 1000  # row hashes are bucketed this finely before TEST_SIZE picks the holdout
+RANDOM_STATE = 42
+
+XGB_PARAMS = dict(n_estimators=300, learning_rate=0.05, max_depth=8, min_child_weight=5,
+                  subsample=0.8, colsample_bytree=0.8, gamma=0.2, objective='reg:squarederror',
+                  random_state=RANDOM_STATE)
+RF_PARAMS = dict(n_estimators=200, max_depth=10, random_state=RANDOM_STATE)
+META_PARAMS = dict(n_estimators=100, learning_rate=0.05, max_depth=6, random_state=RANDOM_STATE)
+
+# Incremental updates: boosting rounds (at a gentler learning rate) and forest
+# trees added per batch of new rows, and how much worse (relative holdout MAE)
+# the updated stack may get before we give up on it and refit from scratch.
+INCREMENTAL_XGB_ROUNDS = 50
+INCREMENTAL_XGB_LEARNING_RATE = 0.01
+INCREMENTAL_RF_TREES = 20
+DRIFT_TOLERANCE = 0.05
+
+
+def holdout_mask(data):
+    """Which rows of `data` belong to the holdout, decided by a hash of each row's own values.
+
+    Unlike a shuffled split, a row's side never depends on the other rows, so
+    rows appended to the dataset never move existing ones between train and
+    holdout. Numbers are hashed as float64 so a column that turns float after
+    an append (e.g. gains a missing value) keeps its rows' hashes.
+    """
+    canonical = data.apply(lambda col: col.astype('float64') if pd.api.types.is_numeric_dtype(col) else col.astype(str))
+    hashes = pd.util.hash_pandas_object(canonical, index=False).to_numpy()
+    return hashes % HOLDOUT_BUCKETS < round(TEST_SIZE * HOLDOUT_BUCKETS)
+
+
+def load_training_data(path=DATA_PATH):
+    data = pd.read_csv(path)
+
+    # Drop unnecessary columns, pick the holdout (before filling: the medians
+    # move as rows are added) & handle missing values
+    data = data.drop(columns=DROP_COLUMNS, errors='ignore')
+    test = holdout_mask(data)
+    data = data.fillna(data.median(numeric_only=True))
+
+    # Define Features (X) and Target Variable (Y)
+    X = data.drop(columns=[TARGET], errors='ignore')
+    y = data[TARGET]
+
+    # Split dataset (~80% train, ~20% test)
+    return X[~test], X[test], y[~test], y[test]
+
+
+def base_learners(threads=None):
+    """`threads` caps each model's n_jobs (None: every core); it does not change the fitted model."""
+    return {'xgb': xgb.XGBRegressor(**XGB_PARAMS, n_jobs=threads),
+            'rf': RandomForestRegressor(**RF_PARAMS, n_jobs=threads)}
+
+
+def meta_learner(threads=None):
+    return xgb.XGBRegressor(**META_PARAMS, n_jobs=threads)
+
+
+def build_stacked_model():
+    """Stacking Model: XGBoost + Random Forest, with an XGBoost meta-learner."""
+    return StackingRegressor(estimators=list(base_learners().items()), final_estimator=meta_learner())
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def data_fingerprint(data_path, features):
+    """Hash of the training split and libraries; keys the out-of-fold cache."""
+    spec = {
+        "data_sha256": file_digest(data_path),
+        "features": list(features),
+        "target": TARGET,
+        "test_size": TEST_SIZE,
+        "split": f"row-hash/{HOLDOUT_BUCKETS}",
+        "random_state": RANDOM_STATE,
+        "xgboost_version": xgb.__version__,
+        "sklearn_version": sklearn.__version__,
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def training_fingerprint(data_path, features):
+    """Hash of everything that determines the fitted model."""
+    spec = {
+        "data": data_fingerprint(data_path, features),
+        "xgb_params": XGB_PARAMS,
+        "rf_params": RF_PARAMS,
+        "meta_params": META_PARAMS,
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def read_metadata(meta_path=META_PATH):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def native_path_for(model_path):
+    return os.path.splitext(model_path)[0] + ".native"
+
+
+def candidate_path(path):
+    """Side path for an artifact that must not replace the one being served."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.candidate{ext}"
+
+
+def save_model(model, encoder, metadata, model_path=MODEL_PATH, meta_path=META_PATH, encoder_path=ENCODER_PATH):
+    """Write encoder, model and metadata via temp files so readers never see a partial artifact.
+
+    The encoder goes first: the model server reloads when the model file changes
+    and picks up whichever encoder is on disk at that point. The pickle stays
+    the training-side copy (incremental updates start from it); the server
+    loads the native artifact written after it, which only counts as current
+    while it is newer than the pickle.
+    """
+    encoder.save(encoder_path)
+
+    tmp_model = model_path + ".tmp"
+    joblib.dump(model, tmp_model)
+    os.replace(tmp_model, model_path)
+
+    if artifact.supports(model):
+        artifact.save_native(model, native_path_for(model_path))
+    else:
+        artifact.remove_native(native_path_for(model_path))
+
+    tmp_meta = meta_path + ".tmp"
+    with open(tmp_meta, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_meta, meta_path)
+
+
+def evaluate(model, X_test, y_test):
+    y_pred = model.predict(X_test)
+    mae = mean_absolute_error(y_test, y_pred)
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+    return {"mae": float(mae), "rmse": float(rmse)}
+
+
+def train_or_load(force_retrain=False, data_path=DATA_PATH, model_path=MODEL_PATH, meta_path=META_PATH,
+                  encoder_path=ENCODER_PATH, oof_path=OOF_PATH, refit_bases=(), threads=None, deadline=None):
+    """Return `(model, encoder, metadata, refit)`, refitting only when the fingerprint changed.
+
+    A refit reuses cached base models whose params are unchanged; `force_retrain`
+    refits all of them and `refit_bases` (e.g. `['rf']`) just the named ones.
+    A model cut short by `deadline` is refit on the next run, and only replaces
+    the saved model if its holdout MAE is no worse than the saved metadata's;
+    otherwise it goes to the candidate paths and the saved model is returned,
+    with the candidate's scores under metadata["candidate"].
+    """
+    X_train, X_test, y_train, y_test = load_training_data(data_path)
+    fingerprint = training_fingerprint(data_path, X_train.columns)
+    encoder = FeatureEncoder.fit(X_train)
+
+    previous = metadata = read_metadata(meta_path)
+    if (not force_retrain and not refit_bases and metadata and metadata.get("fingerprint") == fingerprint
+            and not metadata.get("budget_exhausted") and os.path.exists(model_path)):
+        if not os.path.exists(encoder_path):
+            # Artifact predates encoders; the encoder is cheap to fit from the same split
+            encoder.save(encoder_path)
+        model = joblib.load(model_path)
+        if not artifact.is_current(native_path_for(model_path), model_path) and artifact.supports(model):
+            # Likewise when the native artifact is missing, in an older format, or
+            # older than a pickle written by something else
+            artifact.save_native(model, native_path_for(model_path))
+        return model, FeatureEncoder.load(encoder_path), metadata, False
+
+    estimators = base_learners(threads)
+    refit = list(estimators) if force_retrain else list(refit_bases)
+    model = fit_stack(estimators, meta_learner(threads), X_train, y_train, oof_path,
+                      data_fingerprint(data_path, X_train.columns), refit=refit, deadline=deadline)
+
+    metadata = {"fingerprint": fingerprint, "features": list(X_train.columns)}
+    if deadline is not None and deadline.hit:
+        metadata["budget_exhausted"] = True
+    metadata.update(evaluate(model, X_test, y_test))
+    if (metadata.get("budget_exhausted") and previous and "mae" in previous and os.path.exists(model_path)
+            and metadata["mae"] > previous["mae"]):
+        # The server hot-reloads whatever lands at model_path: keep the better model there
+        paths = [candidate_path(path) for path in (model_path, meta_path, encoder_path)]
+        save_model(model, encoder, metadata, *paths)
+        kept = joblib.load(model_path)
+        previous = dict(previous, candidate={"path": paths[0], "mae": metadata["mae"], "rmse": metadata["rmse"]})
+        return kept, load_encoder(kept, encoder_path), previous, False
+    save_model(model, encoder, metadata, model_path, meta_path, encoder_path)
+    return model, encoder, metadata, True
+
+
+def _append_rows(data_path, rows):
+    """Fold new labelled rows into the training CSV (atomically) so later full fits include them."""
+    data = pd.read_csv(data_path)
+    merged = pd.concat([data, rows.reindex(columns=data.columns)], ignore_index=True)
+    tmp = data_path + ".tmp"
+    merged.to_csv(tmp, index=False)
+    os.replace(tmp, data_path)
+
+
+def update_incremental(new_rows_path, data_path=DATA_PATH, model_path=MODEL_PATH, meta_path=META_PATH,
+                       encoder_path=ENCODER_PATH, oof_path=OOF_PATH, tolerance=DRIFT_TOLERANCE, threads=None):
+    """Update the saved stack with new labelled rows instead of refitting it.
+
+    The XGBoost base model continues boosting from its saved booster on the new
+    rows only. The forest grows a few warm-start trees on the training split
+    plus the new rows (trees fit on the new rows alone are too noisy and
+    throw the meta-learner off); the existing trees and the meta-learner are
+    kept. New rows that hash into the holdout are only used to score, so the
+    holdout stays unseen once they are in the dataset. If the updated stack's
+    holdout MAE is more than `tolerance` worse than the saved stack's on the
+    same rows, the rows are still added to the dataset but the model is refit
+    from scratch. Returns
+    `(model, encoder, metadata, mode)` with mode "incremental" or "refit".
+    """
+    rows = pd.read_csv(new_rows_path)
+    metadata = read_metadata(meta_path)
+    if not metadata or not os.path.exists(model_path):
+        _append_rows(data_path, rows)
+        model, encoder, metadata, _ = train_or_load(data_path=data_path, model_path=model_path, meta_path=meta_path,
+                                                    encoder_path=encoder_path, oof_path=oof_path, threads=threads)
+        return model, encoder, metadata, "refit"
+
+    model = joblib.load(model_path)
+    encoder = load_encoder(model, encoder_path)
+    fill = dict(zip(encoder.features, encoder.fill_values.tolist()))
+    columns = pd.read_csv(data_path, nrows=0).columns
+    new_test = holdout_mask(rows.reindex(columns=columns).drop(columns=DROP_COLUMNS, errors='ignore'))
+    X_new = rows.reindex(columns=encoder.features).fillna(fill)[~new_test]
+    y_new = rows[TARGET][~new_test]
+
+    X_train, X_test, y_train, y_test = load_training_data(data_path)
+    X_test = pd.concat([X_test, rows.reindex(columns=X_test.columns).fillna(fill)[new_test]])
+    y_test = pd.concat([y_test, rows[TARGET][new_test]])
+    baseline = evaluate(model, X_test, y_test)
+
+    updated = copy.deepcopy(model)
+    for i, est in enumerate(updated.estimators_):
+        if isinstance(est, xgb.XGBRegressor) and len(y_new):
+            params = dict(est.get_params(), n_estimators=INCREMENTAL_XGB_ROUNDS,
+                          learning_rate=INCREMENTAL_XGB_LEARNING_RATE, n_jobs=threads)
+            grown = xgb.XGBRegressor(**params).fit(X_new, y_new, xgb_model=est.get_booster())
+        elif isinstance(est, RandomForestRegressor):
+            grown = est.set_params(warm_start=True, n_estimators=len(est.estimators_) + INCREMENTAL_RF_TREES,
+                                   n_jobs=threads)
+            grown.fit(pd.concat([X_train, X_new[X_train.columns]]), pd.concat([y_train, y_new]))
+            grown.set_params(warm_start=False)
+        else:
+            grown = est
+        updated.estimators_[i] = grown
+        updated.named_estimators_[updated.estimators[i][0]] = grown
+    scores = evaluate(updated, X_test, y_test)
+
+    _append_rows(data_path, rows)
+    if scores["mae"] > baseline["mae"] * (1 + tolerance):
+        model, encoder, metadata, _ = train_or_load(data_path=data_path, model_path=model_path, meta_path=meta_path,
+                                                    encoder_path=encoder_path, oof_path=oof_path, threads=threads)
+        metadata = dict(metadata, drift={"baseline": baseline, "incremental": scores})
+        return model, encoder, metadata, "refit"
+
+    # Recorded under the merged dataset's fingerprint, so train_or_load keeps
+    # serving this model until the data or params change again
+    features = list(load_training_data(data_path)[0].columns)
+    metadata = {
+        "fingerprint": training_fingerprint(data_path, features),
+        "features": features,
+        "incremental_rows": metadata.get("incremental_rows", 0) + len(rows),
+        "baseline": baseline,
+    }
+    metadata.update(scores)
+    save_model(updated, encoder, metadata, model_path, meta_path, encoder_path)
+    return updated, encoder, metadata, "incremental"
@@ -0,0 +1,180 @@
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+from sklearn.model_selection import train_test_split
+
+from app.stacking import N_SPLITS, fold_assignments
+from app.training import DATA_PATH, RANDOM_STATE, RF_PARAMS, XGB_PARAMS, data_fingerprint, load_training_data
+
+# -----------------------------------------------
+# 🎛️ HYPERPARAMETER SEARCH
+# -----------------------------------------------
+# Each base model is tuned on its own with the same K folds the stack uses.
+# The training matrix, target and fold ids are written once as .npy files
+# and every worker opens them with mmap_mode='r', so the pool shares one
+# copy of the data through the page cache instead of pickling it per trial.
+# The files are keyed by the training data's fingerprint and rebuilt when the
+# dataset changes. Workers run single-threaded models; parallelism comes from
+# the pool.
+#
+# Early stopping (boosting rounds, forest size) watches an inner split of
+# each fold's training rows, never the fold being scored, so the leaderboard
+# is an unbiased CV estimate.
+
+FOLDS_DIR = "tuning/folds"
+
+DEFAULT_GRIDS = {
+    "xgb": {
+        "max_depth": [4, 6, 8, 10],
+        "min_child_weight": [1, 5, 10],
+        "learning_rate": [0.03, 0.05, 0.1],
+        "subsample": [0.7, 0.8, 1.0],
+        "colsample_bytree": [0.6, 0.8, 1.0],
+        "gamma": [0.0, 0.2, 1.0],
+    },
+    "rf": {
+        "max_depth": [6, 10, 14, None],
+        "min_samples_leaf": [1, 2, 5],
+        "max_features": [1.0, 0.5, "sqrt"],
+    },
+}
+
+# Upper bounds for early stopping: boosting rounds / forest size per trial
+MAX_ROUNDS = {"xgb": 1000, "rf": 400}
+EARLY_STOPPING_ROUNDS = 30  # XGBoost rounds without validation improvement
+RF_STEP = 25  # trees added per early-stopping check
+RF_PATIENCE = 2  # checks without improvement before a forest stops growing
+EARLY_STOPPING_FRACTION = 0.1  # share of each fold's training rows held out for early stopping
+
+_shared = {}
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def build_folds(path=FOLDS_DIR, data_path=DATA_PATH, n_splits=N_SPLITS, rebuild=False):
+    """Write the training split and fold ids unless they already match the data; returns the directory.
+
+    Like OOFCache.bind, the files are keyed by `data_fingerprint`, so rows
+    appended to the dataset (e.g. by incremental updates) trigger a rebuild.
+    """
+    X_train, _, y_train, _ = load_training_data(data_path)
+    key = {"data": data_fingerprint(data_path, X_train.columns), "n_splits": n_splits}
+    if not rebuild and _read_manifest(path) == key:
+        return path
+
+    os.makedirs(path, exist_ok=True)
+    arrays = {
+        "X.npy": np.ascontiguousarray(X_train.to_numpy(dtype=np.float32)),
+        "y.npy": y_train.to_numpy(dtype=np.float64),
+        "folds.npy": fold_assignments(len(y_train), n_splits),
+    }
+    for name, array in arrays.items():
+        with open(os.path.join(path, name + ".tmp"), 'wb') as f:
+            np.save(f, array)
+        os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+    # Manifest last: an interrupted rebuild leaves a mismatch and is redone next time
+    with open(os.path.join(path, "manifest.json.tmp"), 'w') as f:
+        json.dump(key, f, indent=2)
+    os.replace(os.path.join(path, "manifest.json.tmp"), os.path.join(path, "manifest.json"))
+    return path
+
+
+def _init_worker(path):
+    _shared["X"] = np.load(os.path.join(path, "X.npy"), mmap_mode='r')
+    _shared["y"] = np.load(os.path.join(path, "y.npy"), mmap_mode='r')
+    _shared["folds"] = np.load(os.path.join(path, "folds.npy"), mmap_mode='r')
+
+
+def candidates(grid, search="grid", n_iter=20, seed=RANDOM_STATE):
+    """Parameter dicts from a grid: all combinations, or `n_iter` distinct random ones."""
+    keys = sorted(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    if search == "random" and n_iter < len(combos):
+        combos = random.Random(seed).sample(combos, n_iter)
+    return combos
+
+
+def _max_rounds(model_name, params):
+    """A grid's own n_estimators caps early stopping instead of the default bound."""
+    return int(params.get("n_estimators") or MAX_ROUNDS[model_name])
+
+
+def _fit_xgb(params, X_fit, y_fit, X_stop, y_stop):
+    model = xgb.XGBRegressor(**{**XGB_PARAMS, **params, "n_estimators": _max_rounds("xgb", params), "n_jobs": 1,
+                                "early_stopping_rounds": EARLY_STOPPING_ROUNDS})
+    model.fit(X_fit, y_fit, eval_set=[(X_stop, y_stop)], verbose=False)
+    size = model.best_iteration + 1
+    return lambda X: model.predict(X, iteration_range=(0, size)), size
+
+
+def _fit_rf(params, X_fit, y_fit, X_stop, y_stop):
+    model = RandomForestRegressor(**{**RF_PARAMS, **params, "n_estimators": 0, "warm_start": True, "n_jobs": 1})
+    best, best_size, stale = np.inf, 0, 0
+    while model.n_estimators < _max_rounds("rf", params) and stale < RF_PATIENCE:
+        model.set_params(n_estimators=min(model.n_estimators + RF_STEP, _max_rounds("rf", params))).fit(X_fit, y_fit)
+        mae = mean_absolute_error(y_stop, model.predict(X_stop))
+        if mae < best - 1e-9:
+            best, best_size, stale = mae, model.n_estimators, 0
+        else:
+            stale += 1
+    # Trees grown past the best size are dropped (warm start only ever appends)
+    model.estimators_ = model.estimators_[:best_size]
+    model.set_params(n_estimators=best_size)
+    return model.predict, best_size
+
+
+FITTERS = {"xgb": _fit_xgb, "rf": _fit_rf}
+
+
+def run_trial(model_name, params):
+    """K-fold CV of one configuration; early stopping uses an inner split of each fold's training rows."""
+    X, y, folds = _shared["X"], _shared["y"], _shared["folds"]
+    started = time.perf_counter()
+    maes, rmses, sizes = [], [], []
+    for k in np.unique(folds):
+        val = folds == k
+        fit, stop = train_test_split(np.flatnonzero(~val), test_size=EARLY_STOPPING_FRACTION,
+                                     random_state=RANDOM_STATE)
+        predict, size = FITTERS[model_name](params, X[fit], y[fit], X[stop], y[stop])
+        pred = predict(X[val])
+        maes.append(mean_absolute_error(y[val], pred))
+        rmses.append(float(np.sqrt(mean_squared_error(y[val], pred))))
+        sizes.append(size)
+    return {
+        "model": model_name,
+        "params": json.dumps(params, sort_keys=True),
+        "mae": float(np.mean(maes)),
+        "mae_std": float(np.std(maes)),
+        "rmse": float(np.mean(rmses)),
+        "n_estimators": int(np.median(sizes)),
+        "fit_seconds": time.perf_counter() - started,
+    }
+
+
+def search(model_name, grid=None, search="grid", n_iter=20, workers=None, folds_dir=FOLDS_DIR, on_result=None):
+    """Evaluate every candidate on a process pool and return the leaderboard, best first."""
+    configs = candidates(grid or DEFAULT_GRIDS[model_name], search, n_iter)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(folds_dir,)) as pool:
+        futures = [pool.submit(run_trial, model_name, params) for params in configs]
+        for future in as_completed(futures):
+            results.append(future.result())
+            if on_result:
+                on_result(results[-1], len(results), len(configs))
+    return pd.DataFrame(results).sort_values("mae", ignore_index=True)
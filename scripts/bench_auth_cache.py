@@ -0,0 +1,64 @@
+import argparse
+import statistics
+import sys
+import os
+import time
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/.."))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import engine
+from app.main import app, token_cache, user_cache
+
+# -------------------------------
+# AUTH CACHE BENCHMARK
+# -------------------------------
+# Compares per-request latency and SQL statement count for the authenticated
+# read endpoints with the token/user caches cold (cleared before every
+# request, i.e. the old behaviour) and warm. Needs a running database and an
+# existing user with bills, appliances and predictions.
+
+ENDPOINTS = ["/bills/", "/appliances/", "/predictions/"]
+
+parser = argparse.ArgumentParser(description="Benchmark get_current_user with and without the auth cache.")
+parser.add_argument("--email", required=True)
+parser.add_argument("--password", required=True)
+parser.add_argument("-n", "--requests", type=int, default=500)
+args = parser.parse_args()
+
+statements = 0
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    statements += 1
+
+client = TestClient(app)
+login = client.post("/login/", data={"username": args.email, "password": args.password})
+login.raise_for_status()
+headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+def run(path, cold):
+    global statements
+    latencies = []
+    statements = 0
+    for _ in range(args.requests):
+        if cold:
+            token_cache.clear()
+            user_cache.clear()
+        started = time.perf_counter()
+        client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - started)
+    return statistics.mean(latencies) * 1000, statistics.quantiles(latencies, n=100)[98] * 1000, statements / args.requests
+
+
+print(f"{'endpoint':<16}{'mode':<6}{'mean ms':>10}{'p99 ms':>10}{'SQL/req':>10}")
+for path in ENDPOINTS:
+    for mode, cold in (("cold", True), ("warm", False)):
+        mean_ms, p99_ms, per_req = run(path, cold)
+        print(f"{path:<16}{mode:<6}{mean_ms:>10.2f}{p99_ms:>10.2f}{per_req:>10.2f}")
+
+print("token cache:", token_cache.stats())
+print("user cache:", user_cache.stats())
@@ -0,0 +1,96 @@
+import argparse
+import datetime
+import statistics
+import sys
+import os
+import time
+import tracemalloc
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/.."))
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.responses import FastJSONResponse, columns_for, rows_to_dicts
+
+# -------------------------------
+# LIST READ PATH BENCHMARK
+# -------------------------------
+# Times GET /predictions/'s read + serialize step for one consumer's history,
+# the old way (ORM instances -> response_model validation -> json) against
+# the Core path (column tuples -> orjson), and reports rows/s and peak
+# Python memory for each. Seeds an in-memory SQLite database by default;
+# pass --database-url and --consumer-number to measure a real history.
+
+parser = argparse.ArgumentParser(description="Compare ORM and Core+orjson list serialization.")
+parser.add_argument("--database-url", default=None)
+parser.add_argument("--consumer-number", type=int, default=1)
+parser.add_argument("--rows", type=int, default=10000, help="rows to seed when no database URL is given")
+parser.add_argument("-n", "--repeat", type=int, default=5)
+args = parser.parse_args()
+
+if args.database_url:
+    engine = create_engine(args.database_url)
+else:
+    engine = create_engine("sqlite://")
+    models.Prediction.__table__.create(engine)
+    start = datetime.date(1900, 1, 1)
+    with Session(engine) as db:
+        db.execute(models.Prediction.__table__.insert(), [
+            {
+                "consumer_number": args.consumer_number,
+                "month": datetime.date(start.year + i // 12, i % 12 + 1, 1),
+                "energy_consumption": 300.0 + i % 97,
+                "reduced_consumption": 280.0 + i % 89,
+                "bill_amount": 1500.0 + i % 83,
+                "reduced_bill_amount": 1400.0 + i % 79,
+                "carbon_footprint": 246.0 + i % 73,
+                "reduced_carbon_footprint": 229.6 + i % 71,
+            }
+            for i in range(args.rows)
+        ])
+        db.commit()
+
+adapter = TypeAdapter(list[schemas.PredictionResponse])
+
+
+def orm_path(db):
+    rows = db.scalars(
+        select(models.Prediction)
+        .where(models.Prediction.consumer_number == args.consumer_number)
+        .order_by(models.Prediction.month)
+    ).all()
+    content = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+    body = JSONResponse(content).body
+    db.expunge_all()
+    return len(rows), body
+
+
+def core_path(db):
+    rows = db.execute(
+        select(*columns_for(models.Prediction, schemas.PredictionResponse))
+        .where(models.Prediction.consumer_number == args.consumer_number)
+        .order_by(models.Prediction.month)
+    ).all()
+    return len(rows), FastJSONResponse(rows_to_dicts(rows)).body
+
+
+def run(path):
+    timings, peaks = [], []
+    with Session(engine) as db:
+        for _ in range(args.repeat):
+            tracemalloc.start()
+            started = time.perf_counter()
+            count, body = path(db)
+            timings.append(time.perf_counter() - started)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return count, len(body), statistics.median(timings), max(peaks)
+
+
+print(f"{'path':<14}{'rows':>8}{'body KB':>10}{'ms':>10}{'rows/s':>12}{'peak MB':>10}")
+for name, path in (("orm+pydantic", orm_path), ("core+orjson", core_path)):
+    count, size, seconds, peak = run(path)
+    print(f"{name:<14}{count:>8}{size / 1024:>10.0f}{seconds * 1000:>10.1f}{count / seconds:>12.0f}{peak / 2**20:>10.1f}")
@@ -0,0 +1,92 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import os
+import time
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/.."))
+
+import joblib
+import numpy as np
+
+from app.artifact import load_native
+from app.model_server import MODEL_PATH, NATIVE_PATH, fast_predict
+
+# -------------------------------
+# MODEL LOAD BENCHMARK
+# -------------------------------
+# Loads the stacked model the old way (joblib pickle) and from the native
+# artifact (native boosters + memory-mapped forest arrays), each in a fresh
+# process as an API worker would, then scores a batch so the model's pages
+# are actually touched. Reports load time and how much of the process's
+# memory is private versus shared with other processes mapping the same
+# files, and checks both formats predict the same values, on complete rows
+# and on rows with missing values in every column. Run after training has
+# written both artifacts.
+
+parser = argparse.ArgumentParser(description="Compare pickle and native model artifact load time and memory.")
+parser.add_argument("--model-path", default=MODEL_PATH)
+parser.add_argument("--native-path", default=NATIVE_PATH)
+parser.add_argument("-n", "--repeat", type=int, default=5)
+parser.add_argument("--rows", type=int, default=10000, help="rows scored after loading")
+parser.add_argument("--child", choices=["pickle", "native"], help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+
+def memory_kb():
+    """Private and shared resident memory of this process, from /proc/self/smaps_rollup."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
+
+
+def sample_rows(n_features):
+    return np.random.default_rng(0).random((args.rows, n_features), dtype=np.float32) * 100
+
+
+def with_missing(X, share=0.1):
+    """Copy of X with `share` of every column set to NaN."""
+    X = X.copy()
+    X[np.random.default_rng(1).random(X.shape) < share] = np.nan
+    return X
+
+
+if args.child:
+    before = memory_kb()
+    started = time.perf_counter()
+    model = joblib.load(args.model_path) if args.child == "pickle" else load_native(args.native_path)
+    loaded = time.perf_counter() - started
+    fast_predict(model, sample_rows(len(model.feature_names_in_)))
+    after = memory_kb()
+    print(json.dumps({"load_s": loaded, **{k: after[k] - before[k] for k in after}}))
+    sys.exit(0)
+
+
+def run(fmt):
+    command = [sys.executable, __file__, "--child", fmt, "--model-path", args.model_path,
+               "--native-path", args.native_path, "--rows", str(args.rows)]
+    results = [json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+               for _ in range(args.repeat)]
+    return {key: statistics.median(r[key] for r in results) for key in results[0]}
+
+
+pickled = joblib.load(args.model_path)
+native = load_native(args.native_path)
+X = sample_rows(len(pickled.feature_names_in_))
+for label, rows in (("complete rows", X), ("rows with NaNs", with_missing(X))):
+    diff = np.max(np.abs(fast_predict(pickled, rows) - fast_predict(native, rows)))
+    print(f"max |pickle - native| prediction difference over {args.rows} {label}: {diff:.3g}")
+
+print(f"{'format':<8}{'load ms':>10}{'RSS MB':>10}{'private MB':>12}{'shared MB':>11}")
+for fmt in ("pickle", "native"):
+    r = run(fmt)
+    print(f"{fmt:<8}{r['load_s'] * 1000:>10.1f}{r['rss'] / 1024:>10.1f}{r['private'] / 1024:>12.1f}{r['shared'] / 1024:>11.1f}")
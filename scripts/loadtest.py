@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+# -------------------------------
+# SYNC VS ASYNC LOAD TEST
+# -------------------------------
+# Drives a running API (e.g. `uvicorn app.main:app --workers 1`) with N
+# concurrent clients against the sync routes and their /async counterparts
+# and reports throughput and latency for each. Needs an existing user with
+# bills, appliances and predictions.
+
+ENDPOINTS = ["/bills/", "/appliances/", "/predictions/"]
+
+parser = argparse.ArgumentParser(description="Compare sync and async route throughput under concurrency.")
+parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+parser.add_argument("--email", required=True)
+parser.add_argument("--password", required=True)
+parser.add_argument("-c", "--clients", type=int, default=1000)
+parser.add_argument("-d", "--duration", type=float, default=20.0, help="seconds per endpoint and variant")
+args = parser.parse_args()
+
+
+async def client_loop(client, path, headers, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(path, headers=headers)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+            else:
+                latencies.append(time.perf_counter() - started)
+        except httpx.HTTPError as exc:
+            errors.append(type(exc).__name__)
+
+
+async def run(client, path, headers):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    await asyncio.gather(*(client_loop(client, path, headers, deadline, latencies, errors)
+                           for _ in range(args.clients)))
+    if not latencies:
+        return 0.0, float("nan"), float("nan"), len(errors)
+    quantiles = statistics.quantiles(latencies, n=100)
+    return len(latencies) / args.duration, quantiles[49] * 1000, quantiles[98] * 1000, len(errors)
+
+
+async def main():
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60.0) as client:
+        login = await client.post("/login/", data={"username": args.email, "password": args.password})
+        login.raise_for_status()
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        print(f"{args.clients} concurrent clients, {args.duration:.0f}s per run")
+        print(f"{'endpoint':<24}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for path in ENDPOINTS:
+            for variant in (path, "/async" + path):
+                rps, p50, p99, errors = await run(client, variant, headers)
+                print(f"{variant:<24}{rps:>10.0f}{p50:>10.1f}{p99:>10.1f}{errors:>8}")
+
+
+asyncio.run(main())
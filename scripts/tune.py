@@ -0,0 +1,44 @@
+import argparse
+import json
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/.."))
+
+from app.tuning import DEFAULT_GRIDS, FOLDS_DIR, build_folds, search
+
+parser = argparse.ArgumentParser(description="Grid/random search for the stack's base models on a process pool.")
+parser.add_argument("model", choices=sorted(DEFAULT_GRIDS))
+parser.add_argument("--search", choices=["grid", "random"], default="random")
+parser.add_argument("--n-iter", type=int, default=20, help="configurations to try with --search random")
+parser.add_argument("--grid", help="JSON file mapping param name -> list of values (default: built-in grid)")
+parser.add_argument("--workers", type=int, default=None, help="pool size (default: all cores)")
+parser.add_argument("--folds-dir", default=FOLDS_DIR)
+parser.add_argument("--rebuild-folds", action="store_true",
+                    help="rewrite the cached fold matrices even if the training data is unchanged")
+parser.add_argument("--out", default=None, help="leaderboard CSV (default: tuning/leaderboard_<model>.csv)")
+args = parser.parse_args()
+
+# -------------------------------
+# TUNING SCRIPT
+# -------------------------------
+
+# Reuses the cached matrices only while they match the current training data
+build_folds(args.folds_dir, rebuild=args.rebuild_folds)
+
+grid = None
+if args.grid:
+    with open(args.grid) as f:
+        grid = json.load(f)
+
+def progress(result, done, total):
+    print(f"[{done}/{total}] MAE {result['mae']:.3f} RMSE {result['rmse']:.3f} "
+          f"({result['fit_seconds']:.1f}s, {result['n_estimators']} trees) {result['params']}")
+
+leaderboard = search(args.model, grid, args.search, args.n_iter, args.workers, args.folds_dir, on_result=progress)
+
+out = args.out or os.path.join(os.path.dirname(args.folds_dir), f"leaderboard_{args.model}.csv")
+leaderboard.to_csv(out, index=False)
+print(leaderboard.head(10).to_string())
+print(f"Leaderboard written to {out}")
+print(f"Best {args.model} params (merge into app/training.py): {leaderboard.loc[0, 'params']} "
+      f"with n_estimators={leaderboard.loc[0, 'n_estimators']}")